@@ -1,6 +1,19 @@
-import cx_Oracle
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
 import pandas as pd
 import numpy as np
+from pandas.api.types import union_categoricals
+
+import timeindex
+
+try:
+    import cx_Oracle
+except ImportError:  # offline machines only have the SQLite backend
+    cx_Oracle = None
 
 conn_info = {
     # 'host': '10.182.50.108',
@@ -13,78 +26,838 @@ conn_info = {
 
 CONN_STR = '{user}/{psw}@{host}:{port}/{service}'.format(**conn_info)
 
+# session pool settings
+POOL_SIZE = 4
+ACQUIRE_TIMEOUT = 30  # seconds to wait for a free session
+HEALTH_CHECK_INTERVAL = 60  # idle seconds after which a session is pinged before reuse
+
+# rows per fetchmany round trip (and per typed batch) and rows prefetched with the execute
+FETCH_ARRAYSIZE = 10000
+FETCH_PREFETCHROWS = 10000
+
+# seconds a query round trip may take before it is aborted, None for no limit
+QUERY_TIMEOUT = 300
+
+# datasets loaded / refreshed at the same time, each holds one pooled session while it runs
+LOAD_WORKERS = 2
+
+# seconds between incremental refreshes of the dashboard datasets
+REFRESH_INTERVAL = 300
+
+# days of history loaded on a cold start, None for all of it
+HISTORY_DAYS = None
+
+# timestamp column each dataset is kept sorted by
+TIME_COLUMNS = {'production': 'DTENDROLLING', 'stoptime': 'DTSTORE'}
+
+# columns identifying a row when de-duplicating on a refresh watermark
+PRODUCTION_KEY = ['COILIDOUT']
+STOPTIME_KEY = ['PLANT', 'DTSTART']
+
+# Time before the watermark that refreshes fetch again. A stop is stored while it is still open
+# and gets its DTEND later; STOPTIME_SQL skips open stops, so a stop closed after the watermark
+# passed its DTSTORE is only found by looking back. Stops open longer than this are missed.
+LOOKBACK = {'stoptime': pd.Timedelta(days=1)}
+
+# Declared column types of the dashboard frames. Timestamps arrive as native DATEs in the
+# session timezone, repeated strings become categoricals, codes small ints and measurements
+# float32 where a few significant digits are enough. EXITTHICK (a group key compared with the
+# slider values) and EXITWEIGHTMEAS (summed over years of coils) stay float64.
+PRODUCTION_SCHEMA = {
+    'COILIDOUT': 'category',
+    'COILIDIN': 'object',
+    'ALLOYCODE': 'category',
+    'ENTRYTHICK': 'float32',
+    'EXITTHICK': 'float64',
+    'ENTRYWIDTH': 'int16',
+    'ENTRYDIAMPDI': 'float32',
+    'EXITWEIGHTMEAS': 'float64',
+    'DTSTARTROLL': 'datetime',
+    'DTDEPARTURE': 'datetime',
+    'DTENDROLLING': 'datetime',
+    'LENGTHPHASEEXIT': 'float32',
+    'LENGTHTHICKTOL': 'float32',
+}
+
+STOPTIME_SCHEMA = {
+    'PLANT': 'int8',
+    'DTSTART': 'datetime',
+    'DTEND': 'datetime',
+    'NDELAYCODE': 'int16',
+    'DELAYCOMMENT': 'category',
+    'COILID1': 'object',
+    'DTSTORE': 'datetime',
+    'DURATION': 'float64',
+    'DATE': 'datetime',
+    'YEAR': 'int16',
+    'MONTH': 'int8',
+    'HOUR': 'int8',
+}
+
+SCHEMAS = {'production': PRODUCTION_SCHEMA, 'stoptime': STOPTIME_SCHEMA}
+
+
+# cast the columns of a fetched frame to their declared types. Small int columns holding
+# nulls are kept as float32, NaN has no int representation.
+def apply_schema(df, schema):
+    for col, dtype in schema.items():
+        if col not in df:
+            continue
+        values = df[col]
+        if dtype == 'datetime':
+            if not pd.api.types.is_datetime64_any_dtype(values):
+                df[col] = pd.to_datetime(values)
+        elif dtype.startswith('int') and values.isnull().any():
+            df[col] = pd.to_numeric(values).astype('float32')
+        elif values.dtype.name != dtype and not (dtype == 'object' and values.dtype.name == 'string'):
+            df[col] = values.astype(dtype)  # text attached from a shared snapshot stays Arrow backed
+    return df
+
+
+# give the categorical columns of new_rows the categories of df (plus their own new values)
+# so that concatenating the two keeps the columns categorical
+def align_categories(df, new_rows):
+    for col in df.columns:
+        if df[col].dtype.name != 'category' or col not in new_rows:
+            continue
+        extra = pd.Index(new_rows[col].dropna().unique()).difference(df[col].cat.categories)
+        if len(extra):
+            df = df.copy(deep=False)
+            df[col] = df[col].cat.add_categories(extra)
+        new_rows = new_rows.copy(deep=False)
+        new_rows[col] = new_rows[col].astype(df[col].dtype)
+    return df, new_rows
+
+
+# blank strings as NaN; only the object columns can hold them
+def blanks_to_nan(df):
+    text = df.columns[(df.dtypes == object).values]
+    if len(text):
+        df[text] = df[text].replace('', np.nan)
+    return df
+
+
+# one fetchmany batch as a frame
+def batch_frame(rows, columns):
+    return blanks_to_nan(pd.DataFrame.from_records(rows, columns=columns, coerce_float=True))
+
+
+# join typed batches column by column; categoricals are unioned so they stay categorical
+def concat_batches(batches):
+    if len(batches) == 1:
+        return batches[0]
+    data = {}
+    for col in batches[0].columns:
+        parts = [batch[col] for batch in batches]
+        if all(part.dtype.name == 'category' for part in parts):
+            data[col] = pd.Series(union_categoricals([part.values for part in parts]))
+        else:
+            data[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(data)
+
+
+# deep memory footprint of a frame in bytes
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+# Oracle backend, one cx_Oracle connection per pooled session
+class OracleBackend:
+    name = 'oracle'
+
+    def __init__(self, conn_str=CONN_STR, stmtcachesize=20):
+        if cx_Oracle is None:
+            raise ImportError('cx_Oracle is required for the Oracle backend')
+        self.conn_str = conn_str
+        self.stmtcachesize = stmtcachesize
+        self.Error = cx_Oracle.DatabaseError
+
+    def connect(self):
+        conn = cx_Oracle.connect(self.conn_str)
+        conn.stmtcachesize = self.stmtcachesize
+        return conn
+
+    # prefetchrows needs cx_Oracle 8, older clients only get the arraysize
+    def cursor(self, conn, arraysize, prefetchrows):
+        cursor = conn.cursor()
+        cursor.arraysize = arraysize
+        if hasattr(cursor, 'prefetchrows'):
+            cursor.prefetchrows = prefetchrows
+        return cursor
+
+    # round trips longer than seconds are aborted by the client (callTimeout, cx_Oracle 7.2+)
+    def set_timeout(self, conn, seconds):
+        conn.callTimeout = int(seconds * 1000) if seconds else 0
+
+    # break the statement running on conn, called from another thread
+    def cancel(self, conn):
+        conn.cancel()
+
+    def ping(self, conn):
+        conn.ping()
 
-class DB:
+    def close(self, conn):
+        conn.close()
 
-    def __init__(self):
-        pass
-         # self.conn = cx_Oracle.connect(CONN_STR)
 
-    def query(self, query):
+# SQLite stand-in so the pool and queries can run without the plant DB.
+# The default shared in-memory database lives as long as the pool keeps a session open.
+class SQLiteBackend:
+    name = 'sqlite'
+    Error = sqlite3.Error
+
+    def __init__(self, path='file:bi_dash?mode=memory&cache=shared'):
+        self.path = path
+
+    def connect(self):
+        return sqlite3.connect(self.path, uri=self.path.startswith('file:'), check_same_thread=False)
+
+    def cursor(self, conn, arraysize, prefetchrows):
+        cursor = conn.cursor()
+        cursor.arraysize = arraysize
+        return cursor
+
+    # statements running past the deadline are interrupted by the progress handler
+    def set_timeout(self, conn, seconds):
+        if not seconds:
+            conn.set_progress_handler(None, 0)
+            return
+        deadline = time.monotonic() + seconds
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+
+    def cancel(self, conn):
+        conn.interrupt()
+
+    def ping(self, conn):
+        conn.execute('SELECT 1').fetchall()
+
+    def close(self, conn):
+        conn.close()
+
+    # seed a table from a CSV export, e.g. Dataset/STOP_TIME_TAB.csv
+    def load_csv(self, table, path, **kwargs):
+        conn = self.connect()
         try:
-            conn = cx_Oracle.connect(CONN_STR)
-            df = pd.read_sql_query(con=conn, sql=query)
-            return df
-        except cx_Oracle.DatabaseError as e:
-            print(e)
-            conn.close()
+            pd.read_csv(path, **kwargs).to_sql(table, conn, if_exists='replace', index=False)
         finally:
             conn.close()
 
-    def dict_to_df(self, query_result, date=True):
-        items = {
-            val: dict(query_result["records"][val])
-            for val in range(query_result["totalSize"])
+
+class PoolTimeout(Exception):
+    pass
+
+
+# bounded session pool shared by all callbacks, backend agnostic
+class ConnectionPool:
+
+    def __init__(self, backend, max_size=POOL_SIZE, acquire_timeout=ACQUIRE_TIMEOUT,
+                 health_check_interval=HEALTH_CHECK_INTERVAL):
+        self.backend = backend
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._cond = threading.Condition()
+        self._idle = []  # (conn, last release time), most recently used last
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'acquired': 0,
+            'released': 0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'wait_seconds': 0.0,
+            'max_in_use': 0,
         }
-        df = pd.DataFrame.from_dict(items, orient="index").drop(["attributes"], axis=1)
 
-        if date:  # date indicates if the df contains datetime column
-            df["CreatedDate"] = pd.to_datetime(df["CreatedDate"], format="%Y-%m-%d")  # convert to datetime
-            df["CreatedDate"] = df["CreatedDate"].dt.strftime('%Y-%m-%d')  # reset string
-            print(df.head())
-        return df
+    def acquire(self, timeout=None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError('connection pool is closed')
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # reserve the slot now, connect outside the lock
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout('no free session after {:.1f}s ({} in use)'.format(timeout, self._in_use))
+                self._cond.wait(remaining)
+            self._stats['wait_seconds'] += time.monotonic() - started
+
+        try:
+            if conn is None:
+                conn = self._open()
+            elif time.monotonic() - last_used > self.health_check_interval and not self._healthy(conn):
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._in_use += 1
+            self._stats['acquired'] += 1
+            self._stats['max_in_use'] = max(self._stats['max_in_use'], self._in_use)
+        return conn
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            self._in_use -= 1
+            self._stats['released'] += 1
+            discard = discard or self._closed
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if discard:
+            self._close(conn)
 
-    def get_production(self):
-        query_text = """
-                        SELECT  PT.COILIDOUT AS COILIDOUT,PT.COILIDIN_1 AS COILIDIN,PT.ALLOYCODE AS ALLOYCODE,PT.ENTRYTHICK, 
-                        round(PT.EXITTHICK,2) as EXITTHICK , OT.ENTRYWIDTH,PT.ENTRYDIAMPDI,PT.EXITWEIGHTCALC as EXITWEIGHTMEAS,
-                        TO_CHAR(FROM_TZ(PT.DTWELDED, 'UTC') AT TIME ZONE SESSIONTIMEZONE, 'DD.MM.YY hh24:mi') AS DTSTARTROLL,
-                        TO_CHAR(FROM_TZ(PT.DTDEPARTURE, 'UTC') AT TIME ZONE SESSIONTIMEZONE, 'DD.MM.YY hh24:mi') AS DTDEPARTURE,
-                        TO_CHAR(FROM_TZ(PT.DTENDROLLING, 'UTC') AT TIME ZONE SESSIONTIMEZONE, 'MM.DD.YY hh24:mi') AS DTENDROLLING,
-                        (SELECT RZT.LENGTHPHASEEXIT FROM RESULT_ZONE_TAB RZT WHERE COILIDOUT = PT.COILIDOUT AND NZONE = 1) AS LENGTHPHASEEXIT,
-                        (SELECT RZT.LENGTHTHICKTOL FROM RESULT_ZONE_TAB RZT WHERE COILIDOUT = PT.COILIDOUT AND NZONE = 1) AS LENGTHTHICKTOL
-                        FROM PRODUCTION_TAB PT, ORDER_TAB OT WHERE PT.COILIDIN_1 = OT.COILID AND PT.ALLOYCODE = OT.ALLOYCODE
-                     """
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
         try:
-            query_result = self.query(query_text)
-        except cx_Oracle.DatabaseError as e:
+            yield conn
+        except Exception:
+            # a failed statement does not always mean a dead session, check before reuse
+            self.release(conn, discard=not self._healthy(conn, close=False))
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(size=self._size, idle=len(self._idle), in_use=self._in_use, max_size=self.max_size)
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def _open(self):
+        conn = self.backend.connect()
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def _close(self, conn):
+        try:
+            self.backend.close(conn)
+        except self.backend.Error as e:
             print(e)
-        # Fill Weight value to mean value or previous value
-        query_result = query_result.replace('', np.nan)
-        mean_weight = query_result['EXITWEIGHTMEAS'].mean(skipna=True)
+        with self._cond:
+            self._stats['closed'] += 1
+
+    def _healthy(self, conn, close=True):
+        try:
+            self.backend.ping(conn)
+            return True
+        except self.backend.Error:
+            with self._cond:
+                self._stats['health_check_failures'] += 1
+            if close:
+                self._close(conn)
+            return False
+
+
+# Zone-1 lengths come from one outer join on the pre-filtered RESULT_ZONE_TAB rows instead of
+# two correlated subqueries per coil. The FROM part is plain ANSI SQL so the benchmark can run
+# it against SQLite as well.
+PRODUCTION_FROM = """
+                FROM PRODUCTION_TAB PT
+                JOIN ORDER_TAB OT ON PT.COILIDIN_1 = OT.COILID
+                LEFT OUTER JOIN (SELECT COILIDOUT, LENGTHPHASEEXIT, LENGTHTHICKTOL
+                                 FROM RESULT_ZONE_TAB WHERE NZONE = 1) RZT ON RZT.COILIDOUT = PT.COILIDOUT
+                WHERE PT.ALLOYCODE = OT.ALLOYCODE
+             """
+
+PRODUCTION_SQL = """
+                SELECT  PT.COILIDOUT AS COILIDOUT,PT.COILIDIN_1 AS COILIDIN,PT.ALLOYCODE AS ALLOYCODE,PT.ENTRYTHICK, 
+                round(PT.EXITTHICK,2) as EXITTHICK , OT.ENTRYWIDTH,PT.ENTRYDIAMPDI,PT.EXITWEIGHTCALC as EXITWEIGHTMEAS,
+                CAST(FROM_TZ(PT.DTWELDED, 'UTC') AT TIME ZONE SESSIONTIMEZONE AS DATE) AS DTSTARTROLL,
+                CAST(FROM_TZ(PT.DTDEPARTURE, 'UTC') AT TIME ZONE SESSIONTIMEZONE AS DATE) AS DTDEPARTURE,
+                CAST(FROM_TZ(PT.DTENDROLLING, 'UTC') AT TIME ZONE SESSIONTIMEZONE AS DATE) AS DTENDROLLING,
+                RZT.LENGTHPHASEEXIT AS LENGTHPHASEEXIT, RZT.LENGTHTHICKTOL AS LENGTHTHICKTOL""" + PRODUCTION_FROM
+
+STOPTIME_SQL = """
+                SELECT NPLANTTYPE AS Plant,DTSTART, DTEND,NDELAYCODE,DELAYCOMMENT,COILID1,DTSTORE FROM STOP_TIME_TAB WHERE DTEND IS NOT NULL
+             """
+
+# Optional bind variable filters, appended in this order to the queries above: the date range
+# and thickness or plant of Source.get_production/get_stoptime, since the refresh watermark.
+# Local dates are converted to UTC on the bind side so indexes on the raw columns stay usable.
+PRODUCTION_FILTERS = [
+    ('start_date', "PT.DTENDROLLING >= SYS_EXTRACT_UTC(FROM_TZ(CAST(:start_date AS TIMESTAMP), SESSIONTIMEZONE))"),
+    ('end_date', "PT.DTENDROLLING <= SYS_EXTRACT_UTC(FROM_TZ(CAST(:end_date AS TIMESTAMP), SESSIONTIMEZONE))"),
+    ('min_thick', "PT.EXITTHICK >= :min_thick"),
+    ('max_thick', "PT.EXITTHICK <= :max_thick"),
+    ('since', "PT.DTENDROLLING >= SYS_EXTRACT_UTC(FROM_TZ(CAST(:since AS TIMESTAMP), SESSIONTIMEZONE))"),
+]
+
+STOPTIME_FILTERS = [
+    ('start_date', "DTSTORE >= :start_date"),
+    ('end_date', "DTSTORE < :end_date + INTERVAL '1' DAY"),  # end day is inclusive
+    ('plant', "NPLANTTYPE = :plant"),
+    ('since', "DTSTORE >= :since"),
+]
+
+
+# base query and filters of each dataset
+QUERIES = {
+    'production': (PRODUCTION_SQL, PRODUCTION_FILTERS),
+    'stoptime': (STOPTIME_SQL, STOPTIME_FILTERS),
+}
+
+
+# append the filters that are set to a base query. The SQL text only depends on which
+# filters are used, so every call with the same shape hits the session's statement cache.
+def filtered_query(base, filters, values):
+    conditions = []
+    params = {}
+    for name, condition in filters:
+        value = values.get(name)
+        if value is None:
+            continue
+        if name.endswith('_date') or name == 'since':
+            value = pd.to_datetime(value).to_pydatetime()
+        conditions.append(condition)
+        params[name] = value
+    if conditions:
+        base = base.rstrip() + '\n                AND ' + ' AND '.join(conditions)
+    return base, params
+
+
+# Cleaning and derived columns of the fetched rows, shared by the data sources: DB and the
+# file backed csvsource.CSVSource. A source adds fetch(name, since, stats, **filters), the
+# filters being the names of PRODUCTION_FILTERS/STOPTIME_FILTERS.
+class Source:
+
+    def pool_stats(self):
+        return {}
+
+    # nothing to abort unless the source runs queries
+    def cancel(self):
+        return 0
+
+    # coils with DTENDROLLING (local time) from start_date to end_date, thickness bounds on
+    # EXITTHICK; None when the query failed
+    def get_production(self, start_date=None, end_date=None, min_thick=None, max_thick=None):
+        query_result = self.fetch('production', start_date=start_date, end_date=end_date,
+                                  min_thick=min_thick, max_thick=max_thick)
+        if query_result is None:
+            return None
+        return self.clean_production(query_result)
+
+    # start_date/end_date are whole days of DTSTORE, plant is NPLANTTYPE (1 PL, 2 TCM, 3 PLTCM)
+    def get_stoptime(self, start_date=None, end_date=None, plant=None):
+        if start_date is not None:
+            start_date = pd.to_datetime(start_date).normalize()
+        if end_date is not None:
+            end_date = pd.to_datetime(end_date).normalize()
+        query_result = self.fetch('stoptime', start_date=start_date, end_date=end_date, plant=plant)
+        if query_result is None:
+            return None
+        return self.derive_stoptime(query_result)
+
+    # Fill Weight value to mean value or previous value. Incremental refreshes pass the running
+    # weight mean and the last known row so that only the new rows are touched.
+    def clean_production(self, query_result, mean_weight=None, previous=None):
+        query_result = blanks_to_nan(query_result)
+        if mean_weight is None:
+            mean_weight = query_result['EXITWEIGHTMEAS'].mean(skipna=True)
         query_result.loc[query_result.EXITWEIGHTMEAS == 0, 'EXITWEIGHTMEAS'] = mean_weight
-        query_result['EXITWEIGHTMEAS'] = query_result['EXITWEIGHTMEAS'].apply(lambda x: np.round(x, decimals=2))
-        query_result.fillna(method='ffill', inplace=True)
+        query_result['EXITWEIGHTMEAS'] = query_result['EXITWEIGHTMEAS'].round(2)
+        if previous is not None and len(previous):
+            query_result = pd.concat([previous, query_result]).fillna(method='ffill').iloc[len(previous):]
+        else:
+            query_result.fillna(method='ffill', inplace=True)
         # query_result['Date'] = query_result['DTDEPARTURE'].dt.date
-        print(query_result.head())
+        query_result = apply_schema(query_result, PRODUCTION_SCHEMA)
         return query_result
 
-    def get_stoptime(self):
-        query_text = """
-                        SELECT NPLANTTYPE AS Plant,DTSTART, DTEND,NDELAYCODE,DELAYCOMMENT,COILID1,DTSTORE FROM STOP_TIME_TAB WHERE DTEND IS NOT NULL
-                     """
-
-        try:
-            query_result = self.query(query_text)
-        except cx_Oracle.DatabaseError as e:
-            print(e)
+    # derived stop time columns, computed per fetched block
+    def derive_stoptime(self, query_result):
         # query_result.set_index(['DTSTORE'], inplace=True)
         # query_result['PLANT'] = query_result.PLANT.map({1: 'PL', 2: 'TCM', 3: 'PLTCM'})
         query_result['DURATION'] = pd.to_datetime(query_result['DTEND']) - pd.to_datetime(query_result['DTSTART'])
         query_result['DURATION'] = query_result['DURATION']/np.timedelta64(1, 'm')
-        query_result['DATE'] = query_result.DTSTORE.dt.date
+        query_result['DATE'] = query_result.DTSTORE.dt.normalize()
         query_result['YEAR'] = query_result.DTSTORE.dt.year
         query_result['MONTH'] = query_result.DTSTORE.dt.month
         query_result['HOUR'] = query_result.DTSTORE.dt.hour
-        print(query_result.head())
+        query_result = apply_schema(query_result, STOPTIME_SCHEMA)
         return query_result
+
+
+class DB(Source):
+
+    def __init__(self, backend=None, pool_size=POOL_SIZE, acquire_timeout=ACQUIRE_TIMEOUT,
+                 arraysize=FETCH_ARRAYSIZE, prefetchrows=FETCH_PREFETCHROWS, query_timeout=QUERY_TIMEOUT):
+        self.backend = backend if backend is not None else OracleBackend()
+        self.pool = ConnectionPool(self.backend, max_size=pool_size, acquire_timeout=acquire_timeout)
+        self.arraysize = arraysize
+        self.prefetchrows = prefetchrows
+        self.query_timeout = query_timeout
+        self._running = set()  # sessions with a statement in flight, for cancel()
+        self._running_lock = threading.Lock()
+        self.Error = self.backend.Error
+
+    # Result of a query as one frame, typed with schema when given. stats, if passed, gets the
+    # rows, batches and untyped bytes of the result.
+    def query(self, query, params=None, schema=None, stats=None):
+        try:
+            return concat_batches(list(self.stream(query, params, schema, stats)))
+        except self.Error as e:
+            print(e)
+
+    # Result of a query in typed frames of up to arraysize rows. Rows are array-fetched with
+    # fetchmany, so only one batch of Python row tuples exists at a time.
+    def stream(self, query, params=None, schema=None, stats=None):
+        with self.pool.connection() as conn:
+            self.backend.set_timeout(conn, self.query_timeout)
+            cursor = self.backend.cursor(conn, self.arraysize, self.prefetchrows)
+            with self._running_lock:
+                self._running.add(conn)
+            try:
+                cursor.execute(query, params or {})
+                # upper case like Oracle reports unquoted aliases, whatever the backend
+                columns = [d[0].upper() for d in cursor.description]
+                batches = 0
+                while True:
+                    rows = cursor.fetchmany()
+                    if not rows and batches:
+                        break
+                    batch = batch_frame(rows, columns)
+                    if stats is not None:
+                        stats['rows'] = stats.get('rows', 0) + len(batch)
+                        stats['batches'] = stats.get('batches', 0) + 1
+                        stats['raw_bytes'] = stats.get('raw_bytes', 0) + frame_bytes(batch)
+                    batches += 1
+                    yield apply_schema(batch, schema) if schema else batch
+                    if not rows:
+                        break
+            finally:
+                with self._running_lock:
+                    self._running.discard(conn)
+                cursor.close()
+
+    # abort the statements in flight; their queries fail with the driver's error
+    def cancel(self):
+        with self._running_lock:
+            running = list(self._running)
+        for conn in running:
+            try:
+                self.backend.cancel(conn)
+            except self.Error as e:
+                print(e)
+        return len(running)
+
+    # typed rows of a dataset before cleaning, all of them or those at or past since and passing
+    # the filters, bound as variables. stats also gets the seconds the fetch took; a failed
+    # query returns None.
+    def fetch(self, name, since=None, stats=None, **filters):
+        base, conditions = QUERIES[name]
+        query_text, params = filtered_query(base, conditions, dict(filters, since=since))
+        started = time.perf_counter()
+        frame = self.query(query_text, params, schema=SCHEMAS[name], stats=stats)
+        if stats is not None:
+            stats['seconds'] = stats.get('seconds', 0) + time.perf_counter() - started
+        return frame
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def dict_to_df(self, query_result, date=True):
+        items = {
+            val: dict(query_result["records"][val])
+            for val in range(query_result["totalSize"])
+        }
+        df = pd.DataFrame.from_dict(items, orient="index").drop(["attributes"], axis=1)
+
+        if date:  # date indicates if the df contains datetime column
+            df["CreatedDate"] = pd.to_datetime(df["CreatedDate"], format="%Y-%m-%d")  # convert to datetime
+            df["CreatedDate"] = df["CreatedDate"].dt.strftime('%Y-%m-%d')  # reset string
+        return df
+
+
+# Keeps the production and stop time frames current. After the first full load only rows at or
+# past the last DTENDROLLING / DTSTORE watermark (less the dataset's LOOKBACK) are fetched; rows
+# already loaded from that range are de-duplicated by key, and derived columns are computed for
+# the new rows only.
+class RefreshEngine:
+
+    DATASETS = ('stoptime', 'production')
+
+    def __init__(self, db, interval=REFRESH_INTERVAL, archives=None, workers=LOAD_WORKERS,
+                 history_days=HISTORY_DAYS):
+        self.db = db
+        self.interval = interval
+        self.history_days = history_days
+        self.workers = workers
+        self.archives = archives or {}  # name -> partstore.PartitionedStore
+        self.frames = {}
+        self.watermarks = {}
+        self.last_refresh = None
+        self._edge_keys = {}  # keys of the loaded rows in the re-fetched range of each dataset
+        self._edge_times = {}  # and their timestamps
+        self._weight_sum = 0.0  # running raw EXITWEIGHTMEAS stats for the mean imputation
+        self._weight_count = 0
+        self._raw_bytes = {}  # footprint of the fetched frames before typing, per dataset
+        self._listeners = []
+        self._fetch_listeners = []
+        self._locks = {name: threading.Lock() for name in self.DATASETS}  # datasets refresh independently
+        self._poll_locks = {name: threading.Lock() for name in self.DATASETS}
+        self.refreshed_at = {}  # name -> time of the last refresh
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dataset-load')
+        self._stop = threading.Event()
+        self._thread = None
+
+    # fn(name, frame, new_rows) is called whenever a dataset grows
+    def subscribe(self, fn):
+        self._listeners.append(fn)
+
+    # fn(name, stats, failed) is called after every fetch from the source, stats holds its
+    # seconds and rows (and batches / raw_bytes for DB queries)
+    def subscribe_fetch(self, fn):
+        self._fetch_listeners.append(fn)
+
+    # datasets are independent, they load concurrently on up to self.workers sessions
+    def load(self):
+        self._each(self.load_dataset, self.DATASETS)
+
+    # Cold start from the local archive when there is one, then catch up from the DB. With
+    # history_days only the months of the window are read from the archive, and the DB is
+    # asked for the window only when there is no archive.
+    def load_dataset(self, name):
+        archive = self.archives.get(name)
+        start = self.history_start()
+        if archive is not None and archive.partitions():
+            frame = archive.read(start)
+            if frame is not None and start is not None:
+                frame = frame[frame[TIME_COLUMNS[name]] >= start].reset_index(drop=True)
+            if frame is not None and len(frame):
+                self.restore(name, frame, archive.read_state())
+        self.refresh_dataset(name)
+
+    # first day a cold start loads, None for the whole history
+    def history_start(self):
+        if self.history_days is None:
+            return None
+        return pd.Timestamp.now().normalize() - pd.Timedelta(days=self.history_days)
+
+    # scheduled refresh of the datasets loaded so far
+    def refresh(self):
+        counts = self._each(self.refresh_dataset, list(self.frames))
+        self.last_refresh = time.time()
+        return counts
+
+    # Refresh a loaded dataset unless that was done in the last max_age seconds. Live views call
+    # this on every tick, the source is still asked at most once per max_age for all of them.
+    def poll(self, name, max_age):
+        if name not in self.frames:
+            return 0
+        with self._poll_locks[name]:
+            if time.time() - self.refreshed_at.get(name, 0) < max_age:
+                return 0
+            return self.refresh_dataset(name)
+
+    def refresh_dataset(self, name):
+        with self._locks[name]:
+            self.refreshed_at[name] = time.time()
+            if name == 'production':
+                new_rows = self._fetch_production()
+            else:
+                new_rows = self._fetch_stoptime()
+            if new_rows is None or (name in self.frames and new_rows.empty):
+                return 0
+            if name in self.frames:
+                frame, new_rows = align_categories(self.frames[name], new_rows)
+                frame = timeindex.append_sorted(frame, new_rows, TIME_COLUMNS[name])
+            else:
+                frame = timeindex.sort_by_time(new_rows.reset_index(drop=True), TIME_COLUMNS[name])
+            self.frames[name] = frame
+        self._archive(name, new_rows)
+        for fn in self._listeners:
+            fn(name, frame, new_rows)
+        return len(new_rows)
+
+    # footprint of each loaded dataset as fetched (object/float64 columns) and as kept (typed),
+    # published as the bi_dash_dataset_*bytes gauges. raw_bytes only covers rows fetched from the
+    # DB by this process, not archive restores.
+    def memory_report(self):
+        frames = dict(self.frames)
+        report = pd.DataFrame([
+            {'dataset': name, 'rows': len(frame), 'raw_bytes': self._raw_bytes.get(name) or np.nan,
+             'typed_bytes': frame_bytes(frame)}
+            for name, frame in frames.items()
+        ], columns=['dataset', 'rows', 'raw_bytes', 'typed_bytes'])
+        report['ratio'] = report['typed_bytes'] / report['raw_bytes']
+        return report.set_index('dataset')
+
+    def start(self, interval=None):
+        if interval is not None:
+            self.interval = interval
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='dataset-refresh', daemon=True)
+        self._thread.start()
+
+    # stop the scheduled refreshes and abort the queries still running
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+        self.db.cancel()
+
+    # {name: fn(name)} computed on the load executor; the first error is raised once all have finished
+    def _each(self, fn, names):
+        futures = {name: self._executor.submit(fn, name) for name in names}
+        wait(futures.values())
+        return {name: future.result() for name, future in futures.items()}
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(e)
+
+    def _fetch_production(self):
+        stats = {}
+        raw = self.db.fetch('production', self._since('production'), stats, start_date=self.history_start())
+        self._fetched('production', raw, stats)
+        if raw is None:
+            return None
+        raw = self._drop_edge_rows('production', raw, PRODUCTION_KEY)
+        if raw.empty:
+            return raw
+        weights = raw['EXITWEIGHTMEAS']
+        self._weight_sum += weights.sum(skipna=True)
+        self._weight_count += int(weights.count())
+        mean_weight = self._weight_sum / self._weight_count if self._weight_count else np.nan
+        previous = self.frames['production'].iloc[-1:] if 'production' in self.frames else None
+        new_rows = self.db.clean_production(raw, mean_weight=mean_weight, previous=previous)
+        self._move_watermark('production', new_rows, new_rows['DTENDROLLING'], PRODUCTION_KEY)
+        return new_rows
+
+    def _fetch_stoptime(self):
+        stats = {}
+        raw = self.db.fetch('stoptime', self._since('stoptime'), stats, start_date=self.history_start())
+        self._fetched('stoptime', raw, stats)
+        if raw is None:
+            return None
+        raw = self._drop_edge_rows('stoptime', raw, STOPTIME_KEY)
+        if raw.empty:
+            return raw
+        new_rows = self.db.derive_stoptime(raw)
+        self._move_watermark('stoptime', new_rows, new_rows['DTSTORE'], STOPTIME_KEY)
+        return new_rows
+
+    # count the untyped size of the fetched rows, as reported by DB.stream (file sources do not
+    # report it), and pass the fetch stats on to the fetch listeners
+    def _fetched(self, name, raw, stats):
+        if raw is not None:
+            self._raw_bytes[name] = self._raw_bytes.get(name, 0) + stats.get('raw_bytes', 0)
+        for fn in self._fetch_listeners:
+            fn(name, stats, raw is None)
+
+    # Running stats of a dataset that its frame does not hold, saved with the archive and the
+    # shared snapshots: the sum and count of the raw production weights, before imputation.
+    def state(self, name):
+        if name != 'production':
+            return {}
+        return {'weight_sum': self._weight_sum, 'weight_count': self._weight_count}
+
+    # Take over a full frame read back from the archive or a shared snapshot (sharedcache.py),
+    # with the state() saved alongside; its newest rows set the watermark. Archive months are
+    # stored with their own categories, the concatenated frame is re-typed here. Listeners get
+    # the frame as its own new rows.
+    def restore(self, name, frame, state=None):
+        frame = apply_schema(frame, SCHEMAS[name])
+        frame = timeindex.sort_by_time(frame, TIME_COLUMNS[name])
+        state = state or {}
+        with self._locks[name]:
+            self.watermarks.pop(name, None)
+            self._edge_keys.pop(name, None)
+            if name == 'production':
+                if 'weight_count' in state:
+                    self._weight_sum = float(state['weight_sum'])
+                    self._weight_count = int(state['weight_count'])
+                else:  # saved without state: the imputed weights are the best estimate left
+                    weights = frame['EXITWEIGHTMEAS']
+                    self._weight_sum = float(weights.sum())
+                    self._weight_count = int(weights.count())
+                self._move_watermark(name, frame, frame['DTENDROLLING'], PRODUCTION_KEY)
+            else:
+                self._move_watermark(name, frame, frame['DTSTORE'], STOPTIME_KEY)
+            self.frames[name] = frame
+        for fn in self._listeners:
+            fn(name, frame, frame)
+
+    def _archive(self, name, new_rows):
+        archive = self.archives.get(name)
+        if archive is None:
+            return
+        try:
+            archive.append(new_rows)
+            archive.write_state(self.state(name))
+        except OSError as e:
+            print(e)
+
+    # start of the next fetch: the watermark, less the dataset's lookback
+    def _since(self, name):
+        watermark = self.watermarks.get(name)
+        if watermark is None or name not in LOOKBACK:
+            return watermark
+        return watermark - LOOKBACK[name]
+
+    # rows of the re-fetched range were already loaded by a previous fetch
+    def _drop_edge_rows(self, name, raw, key):
+        edge = self._edge_keys.get(name)
+        if edge is None or raw.empty:
+            return raw
+        keys = pd.MultiIndex.from_frame(raw[key])
+        return raw[~keys.isin(edge)]
+
+    # Advance the watermark to the newest row loaded and remember the keys of the loaded rows the
+    # next fetch returns again: those on the watermark, or within the lookback before it.
+    def _move_watermark(self, name, new_rows, stamps, key):
+        if new_rows.empty:
+            return
+        watermark = stamps.max()
+        if self.watermarks.get(name) is not None:
+            watermark = max(watermark, self.watermarks[name])  # late rows do not move it back
+        start = watermark - LOOKBACK.get(name, pd.Timedelta(0))
+        # column by column: selecting rows or several columns of the frame consolidates its
+        # blocks, copying frames that are views of a shared snapshot
+        mask = (stamps >= start).values
+        edge = pd.MultiIndex.from_arrays([new_rows[col].values[mask] for col in key], names=key)
+        times = stamps.values[mask]
+        if name in self._edge_keys:
+            keep = self._edge_times[name] >= start
+            edge = self._edge_keys[name][keep].append(edge)
+            times = np.concatenate([self._edge_times[name][keep], times])
+        self._edge_keys[name] = edge
+        self._edge_times[name] = times
+        self.watermarks[name] = watermark
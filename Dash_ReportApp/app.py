@@ -1,3 +1,5 @@
+import functools
+import os
 import pandas as pd
 import flask
 import dash
@@ -5,12 +7,221 @@ import dash_table
 import dash_core_components as dcc
 import dash_html_components as html
 import dateutil.parser
-from DBManager import DB
+from DBManager import DB, RefreshEngine
+from csvsource import CSVSource, DATASET_DIR
+from partstore import PartitionedStore
+from datastore import DatasetStore
+from rollup import ProductionCube
+from coilindex import CoilIndex
+from figurecache import FigureCache
+from sharedcache import SharedCache
+import metrics
+import export
 server = flask.Flask(__name__)
 app = dash.Dash(__name__, server=server)
 app.config.suppress_callback_exceptions = True
 
-DB = DB()
+# BI_DASH_SOURCE=csv runs the dashboard offline from the exports in BI_DASH_CSV_DIR, Dataset/
+# by default; python -m benchmarks.synthetic writes a directory with a production export
+DATA_SOURCE = os.environ.get('BI_DASH_SOURCE', 'oracle')
+CSV_DIR = os.environ.get('BI_DASH_CSV_DIR', DATASET_DIR)
+
+DB = CSVSource(CSV_DIR) if DATA_SOURCE == 'csv' else DB()
+
+# DataFrames stay on the server, the layout only holds dataset tokens
+STORE = DatasetStore()
+
+# local month partitioned copy of the datasets, the dashboard runs without it if pyarrow is missing.
+# The CSV source keeps its own parse cache and is not archived.
+ARCHIVES = {}
+if DATA_SOURCE != 'csv':
+    try:
+        ARCHIVES = {
+            'production': PartitionedStore('production', 'DTENDROLLING'),
+            'stoptime': PartitionedStore('stoptime', 'DTSTORE'),
+        }
+    except ImportError as e:
+        print(e)
+
+# BI_DASH_HISTORY_DAYS=N loads only the last N days on a cold start (bind variable filter on the
+# DB, archive months outside the window skipped), the refreshes append to it as usual
+HISTORY_DAYS = int(os.environ['BI_DASH_HISTORY_DAYS']) if os.environ.get('BI_DASH_HISTORY_DAYS') else None
+
+# incremental refresh of the datasets, every new block publishes a new STORE version
+REFRESH = RefreshEngine(DB, archives=ARCHIVES, history_days=HISTORY_DAYS)
+REFRESH.subscribe(lambda name, frame, new_rows: STORE.put(name, frame))
+
+# day x alloy x width x exit thickness rollup of the coils, answers the Production tab queries
+CUBE = ProductionCube()
+
+
+# keeps the rollup cube in step with the refreshed coils; a restored frame replaces it
+def update_cube(name, frame, new_rows):
+    if name != 'production':
+        return
+    if new_rows is frame:
+        CUBE.build(frame)
+    else:
+        CUBE.update(new_rows)
+
+
+REFRESH.subscribe(update_cube)
+
+# coil id indexes of the Coil Report: output and input coil of the coils, coil of the stops
+COILS = CoilIndex(['COILIDOUT', 'COILIDIN'])
+STOP_COILS = CoilIndex(['COILID1'])
+
+
+def update_coil_index(name, frame, new_rows):
+    if name == 'production':
+        COILS.refresh(frame, new_rows)
+    else:
+        STOP_COILS.refresh(frame, new_rows)
+
+
+REFRESH.subscribe(update_coil_index)
+
+# figures and tables built per dataset version and filter state, shared by all sessions
+FIGURES = FigureCache()
+REFRESH.subscribe(lambda name, frame, new_rows: FIGURES.invalidate(name))
+
+# BI_DASH_SHARED=1 when several server processes run on one machine: one of them loads and
+# refreshes the datasets, the others map its snapshots instead of querying the source
+SHARED = None
+if os.environ.get('BI_DASH_SHARED'):
+    try:
+        SHARED = SharedCache(REFRESH)
+    except ImportError as e:
+        print(e)
+
+# datasets load on first use or in the warm-up started by index.py
+for name in RefreshEngine.DATASETS:
+    STORE.register_loader(name, functools.partial((SHARED or REFRESH).load_dataset, name))
+
+
+# scheduled refreshes, or following the shared snapshots; started by index.py
+def start_refresh():
+    if SHARED is None:
+        REFRESH.start()
+    else:
+        SHARED.start()
+
+
+# readiness of the lazily loaded datasets, 503 until all of them are in memory
+@server.route('/ready')
+def ready():
+    status = STORE.status()
+    return flask.jsonify(status), 200 if status['ready'] else 503
+
+
+# Rows of an export. A range starting before the history loaded in memory (BI_DASH_HISTORY_DAYS)
+# is read from the data source, with the dates and the filters bound to the query.
+def export_frame(name, start_date, end_date, filters):
+    history_start = REFRESH.history_start()
+    if history_start is None or (start_date is not None and pd.Timestamp(start_date) >= history_start):
+        return STORE.get(STORE.token(name, start_date=start_date, end_date=end_date))
+    if name == 'production':
+        return DB.get_production(start_date, end_date, filters.get('min_thick'), filters.get('max_thick'))
+    return DB.get_stoptime(start_date, end_date, filters.get('plant'))
+
+
+# filtered dataset as a CSV or Parquet download, streamed one chunk at a time, e.g.
+# /export/production.parquet?start_date=2019-01-01&end_date=2019-02-01&max_thick=1.5
+@server.route('/export/<name>.<fmt>')
+def export_dataset(name, fmt):
+    if name not in RefreshEngine.DATASETS or fmt not in export.FORMATS:
+        flask.abort(404)
+    if fmt == 'parquet' and export.pa is None:
+        return 'pyarrow is required for Parquet exports', 501
+    args = flask.request.args
+    try:
+        filters = export.parse_filters(args)
+        df = export_frame(name, args.get('start_date') or None, args.get('end_date') or None, filters)
+    except ValueError as e:
+        return str(e), 400
+    if df is None:
+        return 'the data source is not available', 503
+    chunks = export.csv_chunks(df, filters) if fmt == 'csv' else export.parquet_chunks(df, filters)
+    return flask.Response(chunks, mimetype=export.FORMATS[fmt], headers={
+        'Content-Disposition': 'attachment; filename={}.{}'.format(name, fmt)})
+
+
+# Prometheus metrics: callback latency and payload sizes per output, source fetches,
+# figure cache hits, dataset sizes and startup time
+METRICS = metrics.Registry()
+metrics.instrument_callbacks(server, METRICS)
+
+FETCH_SECONDS = METRICS.histogram('bi_dash_fetch_seconds', 'Time to fetch new rows of a dataset.', ['dataset'])
+FETCH_ROWS = METRICS.counter('bi_dash_fetch_rows_total', 'Rows fetched from the data source.', ['dataset'])
+FETCH_ERRORS = METRICS.counter('bi_dash_fetch_errors_total', 'Fetches that failed.', ['dataset'])
+DATASET_ROWS = METRICS.gauge('bi_dash_dataset_rows', 'Rows of a dataset in memory.', ['dataset'])
+DATASET_BYTES = METRICS.gauge('bi_dash_dataset_bytes', 'Deep memory size of a dataset frame.', ['dataset'])
+DATASET_RAW_BYTES = METRICS.gauge('bi_dash_dataset_raw_bytes', 'Size of the fetched rows before typing.',
+                                  ['dataset'])
+DATASET_READY = METRICS.gauge('bi_dash_dataset_ready', '1 once a dataset is loaded.', ['dataset'])
+DATASET_LOAD_SECONDS = METRICS.gauge('bi_dash_dataset_load_seconds', 'Time of the first load of a dataset.',
+                                     ['dataset'])
+STARTUP_SECONDS = METRICS.gauge('bi_dash_startup_seconds', 'Time until all datasets were loaded.')
+FIGURE_HITS = METRICS.counter('bi_dash_figure_cache_hits_total', 'Figures served from the cache.', ['builder'])
+FIGURE_MISSES = METRICS.counter('bi_dash_figure_cache_misses_total', 'Figures built.', ['builder'])
+FIGURE_HIT_RATIO = METRICS.gauge('bi_dash_figure_cache_hit_ratio', 'Share of figures served from the cache.')
+FIGURE_ENTRIES = METRICS.gauge('bi_dash_figure_cache_entries', 'Figures in the cache.')
+FIGURE_EVICTIONS = METRICS.counter('bi_dash_figure_cache_evictions_total', 'Figures dropped from the cache.')
+POOL_SESSIONS = METRICS.gauge('bi_dash_db_pool_sessions', 'Pooled DB sessions.', ['state'])
+POOL_TIMEOUTS = METRICS.counter('bi_dash_db_pool_timeouts_total', 'Session requests that timed out.')
+SHARED_LEADER = METRICS.gauge('bi_dash_shared_cache_leader', '1 in the process refreshing the shared datasets.')
+
+
+def observe_fetch(name, stats, failed):
+    FETCH_SECONDS.observe(stats.get('seconds', 0), dataset=name)
+    FETCH_ROWS.inc(stats.get('rows', 0), dataset=name)
+    if failed:
+        FETCH_ERRORS.inc(dataset=name)
+
+
+# frame sizes are measured when a dataset changes, not on every scrape
+def observe_dataset(name, frame, new_rows):
+    report = REFRESH.memory_report().loc[name]
+    DATASET_ROWS.set(report['rows'], dataset=name)
+    DATASET_BYTES.set(report['typed_bytes'], dataset=name)
+    if pd.notnull(report['raw_bytes']):
+        DATASET_RAW_BYTES.set(report['raw_bytes'], dataset=name)
+
+
+def update_gauges():
+    status = STORE.status()
+    STARTUP_SECONDS.set(status['startup_seconds'])
+    for name, dataset in status['datasets'].items():
+        DATASET_READY.set(dataset['loaded'], dataset=name)
+        DATASET_LOAD_SECONDS.set(dataset['load_seconds'], dataset=name)
+
+    cache = FIGURES.stats()
+    for builder, counts in cache['builders'].items():
+        FIGURE_HITS.set(counts['hits'], builder=builder)
+        FIGURE_MISSES.set(counts['misses'], builder=builder)
+    FIGURE_HIT_RATIO.set(cache['hit_rate'])
+    FIGURE_ENTRIES.set(cache['size'])
+    FIGURE_EVICTIONS.set(cache['evictions'])
+
+    pool = DB.pool_stats()
+    if pool:
+        POOL_SESSIONS.set(pool['in_use'], state='in_use')
+        POOL_SESSIONS.set(pool['idle'], state='idle')
+        POOL_SESSIONS.set(pool['max_size'], state='max')
+        POOL_TIMEOUTS.set(pool['timeouts'])
+
+    if SHARED is not None:
+        SHARED_LEADER.set(SHARED.is_leader())
+
+
+REFRESH.subscribe_fetch(observe_fetch)
+REFRESH.subscribe(observe_dataset)
+METRICS.on_scrape(update_gauges)
+
+
+@server.route('/metrics')
+def prometheus_metrics():
+    return flask.Response(METRICS.render(), content_type=metrics.CONTENT_TYPE)
 
 
 # return html Table with data frame values
@@ -19,15 +230,10 @@ def df_to_table(df):
         # Header
         [html.Tr([html.Th(col) for col in df.columns])] +
 
-        # Body
+        # Body, from the row lists of the frame instead of per-cell lookups
         [
-            html.Tr(
-                [
-                    html.Td(df.iloc[i][col])
-                    for col in df.columns
-                ]
-            )
-            for i in range(len(df))
+            html.Tr([html.Td(value) for value in row])
+            for row in df.values.tolist()
         ]
     )
 
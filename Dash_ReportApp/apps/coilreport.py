@@ -1,24 +1,133 @@
 # -*- coding: utf-8 -*-
-import math
-import json
-from datetime import date
-import dateutil.parser
-
-import pandas as pd
-import flask
-import dash
-from dash.dependencies import Input, Output, State
 import dash_core_components as dcc
 import dash_html_components as html
-import plotly.plotly as py
-from plotly import graph_objs as go
+import pandas as pd
+import timeindex
+from app import app, df_to_table, STORE, COILS, STOP_COILS
+from dash.dependencies import Input, Output
+
+# typed characters before ids are suggested
+MIN_PREFIX = 3
+
+# columns of the coil record; the zone-1 lengths are shown on their own
+RECORD_COLUMNS = ['COILIDOUT', 'COILIDIN', 'ALLOYCODE', 'ENTRYTHICK', 'EXITTHICK', 'ENTRYWIDTH',
+                  'ENTRYDIAMPDI', 'EXITWEIGHTMEAS', 'DTSTARTROLL', 'DTENDROLLING', 'DTDEPARTURE']
+ZONE1_COLUMNS = ['LENGTHPHASEEXIT', 'LENGTHTHICKTOL']
+STOP_COLUMNS = ['PLANT', 'DTSTART', 'DTEND', 'DURATION', 'NDELAYCODE', 'DELAYCOMMENT', 'COILID1', 'DTSTORE']
+
+TABLE_STYLE = {
+    "maxHeight": "320px",
+    "overflowY": "scroll",
+    "padding": "8",
+    "marginTop": "5",
+    "backgroundColor": "white",
+    "border": "1px solid #C8D4E3",
+    "borderRadius": "3px"
+}
 
 layout = [
 
-    # top controls
+    # search box, the browser shows the suggested ids of the datalist under it
     html.Div(
         [
-            html.H3("Coil Report  Tab")
-        ])
+            html.Div(
+                dcc.Input(
+                    id='coil_search',
+                    type='text',
+                    list='coil_suggestions',
+                    autoComplete='off',
+                    placeholder='COILIDOUT or COILIDIN',
+                    style={'width': '100%'},
+                ),
+                className="four columns",
+            ),
+            html.Datalist(id='coil_suggestions'),
+        ],
+        className="row",
+        style={"marginBottom": "10"},
+    ),
+
+    html.Div(id='coil_record', className="row", style=TABLE_STYLE),
+    html.Div(id='coil_stops', className="row", style=TABLE_STYLE),
 
 ]
+
+
+# ids starting with the typed text, from the coil index instead of the database
+@app.callback(Output('coil_suggestions', 'children'), [Input('coil_search', 'value')])
+def coil_suggestions_callback(value):
+    if not value or len(value.strip()) < MIN_PREFIX:
+        return []
+    STORE.get(STORE.handle('production'))
+    return [html.Option(value=coil_id) for coil_id in COILS.complete(value)]
+
+
+# coils of a typed id: its production record, and the zone-1 lengths
+@app.callback(
+    Output('coil_record', 'children'),
+    [Input('coil_search', 'value'), Input('production_df', 'children')]
+)
+def coil_record_callback(value, df):
+    coils = find_coils(value)
+    if coils is None:
+        return html.P('Type an output or input coil id.')
+    if coils.empty:
+        return html.P('No coil {}.'.format(value.strip().upper()))
+    return [
+        html.P('Production record'),
+        df_to_table(display(coils, RECORD_COLUMNS)),
+        html.P('Zone 1 lengths'),
+        df_to_table(display(coils, ['COILIDOUT'] + ZONE1_COLUMNS)),
+    ]
+
+
+# stop events of the coils of a typed id
+@app.callback(
+    Output('coil_stops', 'children'),
+    [Input('coil_search', 'value'), Input('stoptime_df', 'children')]
+)
+def coil_stops_callback(value, df):
+    coils = find_coils(value)
+    if coils is None or coils.empty:
+        return []
+    stops = coil_stops(coils)
+    if stops.empty:
+        return html.P('No stop events during these coils.')
+    return [html.P('Stop events'), df_to_table(display(stops, STOP_COLUMNS))]
+
+
+# production rows of a typed coil id, None while nothing is typed. Getting the production
+# dataset loads it on first use, which also builds the index.
+def find_coils(value):
+    if not value or not value.strip():
+        return None
+    STORE.get(STORE.handle('production'))
+    return COILS.lookup(value)
+
+
+# Stops booked against the coils (COILID1) and stops booked while one of them was on the line,
+# from DTSTARTROLL to DTDEPARTURE. The stop frame is sorted by DTSTORE, so the second part is
+# a binary search slice.
+def coil_stops(coils):
+    STORE.get(STORE.handle('stoptime'))
+    parts = []
+    for coil_id in pd.unique(coils[['COILIDOUT', 'COILIDIN']].values.ravel()):
+        booked = STOP_COILS.lookup(coil_id)
+        if booked is not None:
+            parts.append(booked)
+    frame = STOP_COILS.frame
+    if frame is not None:
+        for start, end in zip(coils['DTSTARTROLL'], coils['DTDEPARTURE']):
+            if pd.notnull(start) and pd.notnull(end):
+                parts.append(timeindex.time_slice(frame, 'DTSTORE', start, end))
+    if not parts:
+        return pd.DataFrame(columns=STOP_COLUMNS)
+    stops = pd.concat(parts)
+    return stops[~stops.index.duplicated()].sort_values('DTSTORE')
+
+
+# columns of a frame as display text; through object first, a categorical column would convert
+# all of its categories
+def display(df, columns):
+    df = df[[col for col in columns if col in df]].astype(object)
+    return df.where(df.notnull(), '').astype(str)
@@ -3,12 +3,15 @@ from datetime import datetime as dt
 
 import dash_core_components as dcc
 import dash_html_components as html
-import dash_table
-import math
+import downsample
+import export
+import json
 import numpy as np
-import pandas as pd
-from app import app, indicator
-from dash.dependencies import Input, Output, State
+import paging
+import rollup
+import timeindex
+from app import app, indicator, STORE, CUBE, FIGURES
+from dash.dependencies import ClientsideFunction, Input, Output, State
 from plotly import graph_objs as go
 
 
@@ -73,26 +76,24 @@ def thickness_source(df):
     return {"data": data, "layout": layout}
 
 
-# function to perform date range filter
-def filter_data(df, start_date, end_date):
-    if start_date is not None:
-        start_date = pd.to_datetime(start_date)
-    if end_date is not None:
-        end_date = pd.to_datetime(end_date)
+# function to perform date range filter, registered as the STORE view of the production data.
+# The frame is kept sorted by the parsed DTENDROLLING, so (start_date, end_date] is a binary
+# search slice sharing the data of the full frame.
+def filter_data(df, start_date=None, end_date=None):
+    if start_date is None and end_date is None:
+        return df
+    return timeindex.time_slice(df, 'DTENDROLLING', start_date, end_date, closed='right')
 
-    df['DTENDROLLING'] = pd.to_datetime(df['DTENDROLLING'])
 
-    if start_date is not None:
-        mask = (df['DTENDROLLING'] > start_date) & (df['DTENDROLLING'] <= end_date)
-        df = df.loc[mask]
-    return df
+STORE.register_filter('production', filter_data)
 
 
-# Bar Chart for Weight Analysis
-def date_weight_source(df):
+# Bar Chart for Weight Analysis, one bar per day or per longer bucket (downsample.bar_frequency).
+# The zoom of the user is kept over updates until uirevision changes.
+def date_weight_source(df, freq='D', uirevision=None):
     types = df["Date"]
     values = np.round(df["EXITWEIGHTMEAS"])
-    data = [go.Bar(x=types, y=values,
+    data = [go.Bar(x=types, y=values, name=downsample.FREQUENCY_NAMES[freq],
                    orientation="v")]  # x could be any column value since its a count
 
     layout = go.Layout(
@@ -100,6 +101,7 @@ def date_weight_source(df):
         margin=dict(l=210, r=25, b=20, t=0, pad=4),
         paper_bgcolor="white",
         plot_bgcolor="white",
+        uirevision=uirevision,
     )
 
     return {"data": data, "layout": layout}
@@ -132,6 +134,18 @@ layout = [
                 ),
                 className="four columns"
             ),
+            html.Div(
+                [
+                    html.A('CSV', id='production_export_csv', href=export.export_url('production', 'csv')),
+                    ' | ',
+                    html.A('Parquet', id='production_export_parquet',
+                           href=export.export_url('production', 'parquet')),
+                ],
+                className="two columns",
+            ),
+            # totals and thickness chart of the date range; indicators, the thickness chart and
+            # the export links are drawn from it in the browser (assets/production_kpis.js)
+            dcc.Store(id='production_kpis'),
         ],
         className="row",
         style={"marginBottom": "10"},
@@ -276,137 +290,27 @@ layout = [
               [State("date-picker-range", "start_date"),
                State("date-picker-range", "end_date")])
 def update_output(df, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    df['DTENDROLLING'] = pd.to_datetime(df['DTENDROLLING'])
-    df['Date'] = df.DTENDROLLING.dt.date
     if n_clicks > 0:
-        df = filter_data(df, start_date, end_date)
-    else:
-        pass
-    return df.to_json(orient="split")
-
-
-# updates left indicator based on df updates
-@app.callback(
-    Output("left_leads_indicator", "children"),
-    [Input("time_df", "children"), Input('submit-button', 'n_clicks')],
-    [State("date-picker-range", "start_date"),
-     State("date-picker-range", "end_date")]
-)
-def left_leads_indicator_callback(df, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    coil_count = len(df)
-    if coil_count > 0:
-        return coil_count
-    else:
-        return 0
-
-
-# updates middle indicator based on df updates
-@app.callback(
-    Output("middle_leads_indicator", "children"),
-    [Input("time_df", "children"), Input('submit-button', 'n_clicks')],
-    [State("date-picker-range", "start_date"),
-     State("date-picker-range", "end_date")]
-)
-def middle_leads_indicator_callback(df, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    return math.floor((df['EXITWEIGHTMEAS'].aggregate(sum)) / 1000)
-
-
-# updates right indicator based on df updates
-@app.callback(
-    Output("right_leads_indicator", "children"),
-    [Input("time_df", "children"), Input('submit-button', 'n_clicks')],
-    [State("date-picker-range", "start_date"),
-     State("date-picker-range", "end_date")]
-)
-def right_leads_indicator_callback(df, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    coil_count = len(df)
-    if coil_count > 0:
-        tot_weight = df['EXITWEIGHTMEAS'].aggregate(sum)
-        return math.floor(tot_weight / coil_count)
-    else:
-        return 0
-
-
-# update pie chart figure df updates
-@app.callback(
-    Output("alloy_source", "figure"),
-    [Input('submit-button', 'n_clicks'), Input("time_df", "children")],
-    [State("date-picker-range", "start_date"),
-     State("date-picker-range", "end_date")]
-)
-def alloy_source_callback(n_clicks, df, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    allycode_stats = df.groupby('ALLOYCODE')['EXITTHICK'].describe().reset_index()
-    return alloy_source(allycode_stats)
-
-
-# update bar chart figure df updates
-@app.callback(
-    Output("daily_weight_source", "figure"),
-    [Input('submit-button', 'n_clicks'), Input("time_df", "children")],
-    [State("date-picker-range", "start_date"),
-     State("date-picker-range", "end_date")]
-)
-def weight_source_callback(n_clicks, df, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    exitweightperday = df.groupby('Date')['EXITWEIGHTMEAS'].sum().reset_index()
-    exitweightperday['EXITWEIGHTMEAS'] = np.round(exitweightperday.EXITWEIGHTMEAS / 1000)
-    return date_weight_source(exitweightperday)
+        return STORE.token('production', start_date=start_date, end_date=end_date)
+    return STORE.token('production', start_date=None, end_date=None)
 
 
-# update pie chart figure df updates
-@app.callback(
-    Output("width_source", "figure"),
-    [Input("time_df", "children"), Input('submit-button', 'n_clicks')],
-    [State("date-picker-range", "start_date"),
-     State("date-picker-range", "end_date")]
+# Download links for the picked date range and thickness range, built in the browser like
+# export.export_url() so that dragging the slider does not call the server
+app.clientside_callback(
+    ClientsideFunction('production', 'exportLinks'),
+    [Output('production_export_csv', 'href'),
+     Output('production_export_parquet', 'href')],
+    [Input('production_kpis', 'data'), Input('thicknessslider', 'value')]
 )
-def width_source_callback(df, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    width_stats = df.groupby('ENTRYWIDTH')['EXITTHICK'].describe().reset_index()
-    return width_source(width_stats)
 
 
-# update pie chart figure df updates
-@app.callback(
-    Output("thickness_leads", "figure"),
-    [Input("thicknessslider", "value"),
-     Input("time_df", "children"), Input('submit-button', 'n_clicks')],
-    [State("date-picker-range", "start_date"),
-     State("date-picker-range", "end_date")]
-)
-def thickness_source_callback(value, df, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    thickness_stats = df.groupby('EXITTHICK')['EXITWEIGHTMEAS'].describe().reset_index()
-    thickness_stats = thickness_stats[thickness_stats['EXITTHICK'] <= value[1]]
-    return thickness_source(thickness_stats)
-
-
-# update table based on drop down value and df updates
-@app.callback(
-    Output("alloy_thickness_table", "children"),
-    [Input("time_df", "children"), Input('submit-button', 'n_clicks')],
-    [State("date-picker-range", "start_date"),
-     State("date-picker-range", "end_date")],
-)
-def aleads_table_callback(df, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    df = df.groupby('ALLOYCODE')['EXITTHICK'].describe()
-    df = df.reset_index().rename(
-        columns={'ALLOYCODE': 'Alloy Code', 'count': 'Coils Count', 'min': 'Min. Thickness', 'mean': 'Avg. Thickness',
-                 'max': 'Max. Thickness'})
-    df['Avg. Thickness'] = df['Avg. Thickness'].round(2)
-    df.drop(['std', '25%', '50%', '75%'], axis=1, inplace=True)
-    datatable = dash_table.DataTable(
-        columns=[{"name": i, "id": i} for i in df.columns],
-        data=df.to_dict("rows"),
+# DataTable for the grouped stats tables, paged and sorted by the table page callbacks
+def stats_table(table_id, df):
+    return paging.paged_table(
+        table_id,
+        df,
         n_fixed_rows=1,
-        # filtering=True,
-        sorting=True,
         style_cell={'width': '150px', 'padding': '5px', 'textAlign': 'center'},
         style_cell_conditional=[{
             'if': {'row_index': 'odd'},
@@ -427,94 +331,173 @@ def aleads_table_callback(df, n_clicks, start_date, end_date):
             'border': 'thin lightgrey solid'
         },
     )
-    return datatable
 
 
-# update table based on drop down value and df updates
+# updates the KPI summary, charts and tables from one aggregation of the filtered coils
 @app.callback(
-    Output("width_thickness_table", "children"),
-    [Input("time_df", "children"), Input('submit-button', 'n_clicks')],
-    [State("date-picker-range", "start_date"),
-     State("date-picker-range", "end_date")],
+    [Output("production_kpis", "data"),
+     Output("alloy_source", "figure"),
+     Output("width_source", "figure"),
+     Output("alloy_thickness_table", "children"),
+     Output("width_thickness_table", "children"),
+     Output("exit_thickness_weight_table", "children")],
+    [Input("time_df", "children")]
 )
-def bleads_table_callback(df, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    df = df.groupby('ENTRYWIDTH')['EXITTHICK'].describe()
-    df = df.reset_index().rename(
-        columns={'ENTRYWIDTH': 'Entry Width', 'count': 'Coils Count', 'min': 'Min. Thickness', 'mean': 'Avg. Thickness',
-                 'max': 'Max. Thickness'})
-    df['Avg. Thickness'] = df['Avg. Thickness'].round(2)
-    df.drop(['std', '25%', '50%', '75%'], axis=1, inplace=True)
-    datatable = dash_table.DataTable(
-        columns=[{"name": i, "id": i} for i in df.columns],
-        data=df.to_dict("rows"),
-        n_fixed_rows=1,
-        # filtering=True,
-        sorting=True,
-        style_cell={'width': '150px', 'padding': '5px', 'textAlign': 'center'},
-        style_cell_conditional=[{
-            'if': {'row_index': 'odd'},
-            'backgroundColor': '#3D9970',
-        }] + [
-                                   {
-                                       'if': {'column_id': c},
-                                       'textAlign': 'left'
-                                   } for c in ['COILIDOUT', 'COILIDIN', 'ALLOYCODE']
-                               ],
-        style_header={
-            'backgroundColor': 'white',
-            'fontWeight': 'bold'
-        },
-        style_table={
-            'maxHeight': '280px',
-            'overflowY': 'scroll',
-            'border': 'thin lightgrey solid'
-        },
+def production_callback(df):
+    filters = STORE.filters(df)
+    return production_view(filters.get('start_date'), filters.get('end_date'))
+
+
+# KPI summary, charts and tables of a date range, built once per cube version
+@FIGURES.memoize('production', lambda: CUBE.version)
+def production_view(start_date, end_date):
+    coil_count, tot_weight = rollup.totals(CUBE.query(start_date, end_date))
+
+    allycode_stats = production_stats(start_date, end_date, 'ALLOYCODE')
+    width_stats = production_stats(start_date, end_date, 'ENTRYWIDTH')
+    weight_stats = production_stats(start_date, end_date, 'EXITTHICK')
+
+    kpis = {
+        'coils': coil_count,
+        'weight': tot_weight,
+        'thickness': thickness_source(weight_stats),
+        'filters': {k: v for k, v in (('start_date', start_date), ('end_date', end_date)) if v is not None},
+    }
+
+    return (
+        kpis,
+        alloy_source(allycode_stats),
+        width_source(width_stats),
+        stats_table('alloy_thickness_datatable', table_rows(start_date, end_date, 'ALLOYCODE')),
+        stats_table('width_thickness_datatable', table_rows(start_date, end_date, 'ENTRYWIDTH')),
+        stats_table('exit_thickness_weight_datatable', table_rows(start_date, end_date, 'EXITTHICK')),
     )
-    return datatable
 
 
-# update table based on drop down value and df updates
+# Grouped stats of the coils of a date range: exit thickness per ALLOYCODE or ENTRYWIDTH, or
+# exit weight per EXITTHICK. Shared by the charts, the tables and their page callbacks.
+@FIGURES.memoize('production', lambda: CUBE.version)
+def production_stats(start_date, end_date, by):
+    cells = CUBE.query(start_date, end_date)
+    if by == 'EXITTHICK':
+        return rollup.weight_by_thickness(cells)
+    return rollup.thickness_by(cells, by)
+
+
+# Weight per day of the date range, per week or longer when the range has too many days for
+# the plot. Zooming in sends the x range of the zoom, drawn again from the cube in finer buckets.
 @app.callback(
-    Output("exit_thickness_weight_table", "children"),
-    [Input("time_df", "children"), Input('submit-button', 'n_clicks')],
-    [State("date-picker-range", "start_date"),
-     State("date-picker-range", "end_date")],
+    Output("daily_weight_source", "figure"),
+    [Input("time_df", "children"), Input("daily_weight_source", "relayoutData")]
+)
+def daily_weight_callback(df, relayout):
+    filters = STORE.filters(df)
+    return daily_weight_view(filters.get('start_date'), filters.get('end_date'), *downsample.zoom_range(relayout))
+
+
+@FIGURES.memoize('production', lambda: CUBE.version)
+def daily_weight_view(start_date, end_date, zoom_start, zoom_end):
+    exitweightperday = rollup.daily_weight(CUBE.query(*downsample.narrow(start_date, end_date, zoom_start, zoom_end)))
+    freq = downsample.bar_frequency(exitweightperday['Date'].min(), exitweightperday['Date'].max())
+    exitweightperday = downsample.bucket_bars(exitweightperday, 'Date', freq, sums=['EXITWEIGHTMEAS'])
+    exitweightperday['EXITWEIGHTMEAS'] = np.round(exitweightperday.EXITWEIGHTMEAS / 1000)
+    return date_weight_source(exitweightperday, freq, uirevision=json.dumps([start_date, end_date]))
+
+
+# indicators from the KPI summary: coil count, total weight in t and weight per coil in kg
+app.clientside_callback(
+    ClientsideFunction('production', 'indicators'),
+    [Output("left_leads_indicator", "children"),
+     Output("middle_leads_indicator", "children"),
+     Output("right_leads_indicator", "children")],
+    [Input('production_kpis', 'data')]
+)
+
+# thickness chart of the KPI summary cut at the slider's upper thickness, one bar per EXITTHICK
+app.clientside_callback(
+    ClientsideFunction('production', 'thickness'),
+    Output("thickness_leads", "figure"),
+    [Input('production_kpis', 'data'), Input("thicknessslider", "value")]
 )
-def cleads_table_callback(df, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    df = df.groupby('EXITTHICK')['EXITWEIGHTMEAS'].describe()
-    df = df.reset_index().rename(
+
+
+# alloy code table rows from the ALLOYCODE thickness stats
+def alloy_thickness_frame(df):
+    df = df.rename(
+        columns={'ALLOYCODE': 'Alloy Code', 'count': 'Coils Count', 'min': 'Min. Thickness', 'mean': 'Avg. Thickness',
+                 'max': 'Max. Thickness'})
+    df['Avg. Thickness'] = df['Avg. Thickness'].round(2)
+    return df
+
+
+# entry width table rows from the ENTRYWIDTH thickness stats
+def width_thickness_frame(df):
+    df = df.rename(
+        columns={'ENTRYWIDTH': 'Entry Width', 'count': 'Coils Count', 'min': 'Min. Thickness', 'mean': 'Avg. Thickness',
+                 'max': 'Max. Thickness'})
+    df['Avg. Thickness'] = df['Avg. Thickness'].round(2)
+    return df
+
+
+# exit thickness table rows from the weight stats
+def exit_thickness_weight_frame(df):
+    df = df.rename(
         columns={'EXITTHICK': 'Ext thickness', 'count': 'Coils Count', 'min': 'Min. Weight', 'mean': 'Avg. Weight',
                  'max': 'Max. Weight'})
     df['Avg. Weight'] = df['Avg. Weight'].round(2)
     df['Ext thickness'] = df['Ext thickness'].round(2)
-    df.drop(['std', '25%', '50%', '75%'], axis=1, inplace=True)
-    datatable = dash_table.DataTable(
-        columns=[{"name": i, "id": i} for i in df.columns],
-        data=df.to_dict("rows"),
-        n_fixed_rows=1,
-        # filtering=True,
-        sorting=True,
-        style_cell={'width': '150px', 'padding': '5px', 'textAlign': 'center'},
-        style_cell_conditional=[{
-            'if': {'row_index': 'odd'},
-            'backgroundColor': '#3D9970',
-        }] + [
-                                   {
-                                       'if': {'column_id': c},
-                                       'textAlign': 'left'
-                                   } for c in ['COILIDOUT', 'COILIDIN', 'ALLOYCODE']
-                               ],
-        style_header={
-            'backgroundColor': 'white',
-            'fontWeight': 'bold'
-        },
-        style_table={
-            'maxHeight': '280px',
-            'overflowY': 'scroll',
-            'border': 'thin lightgrey solid'
-        },
-    )
+    return df
+
+
+TABLE_FRAMES = {
+    'ALLOYCODE': alloy_thickness_frame,
+    'ENTRYWIDTH': width_thickness_frame,
+    'EXITTHICK': exit_thickness_weight_frame,
+}
 
-    return datatable
+
+# rows of a stats table of a date range, built once and paged by the page callbacks
+@FIGURES.memoize('production', lambda: CUBE.version)
+def table_rows(start_date, end_date, by):
+    return TABLE_FRAMES[by](production_stats(start_date, end_date, by))
+
+
+# visible page of a stats table of a time_df token
+def table_page(token, by, pagination_settings, sort_by, filter):
+    filters = STORE.filters(token)
+    rows = table_rows(filters.get('start_date'), filters.get('end_date'), by)
+    return paging.table_page(rows, pagination_settings, sort_by, filter)
+
+
+# pages of the three stats tables for their current paging, sorting and filter
+@app.callback(
+    Output("alloy_thickness_datatable", "data"),
+    [Input("alloy_thickness_datatable", "pagination_settings"),
+     Input("alloy_thickness_datatable", "sort_by"),
+     Input("alloy_thickness_datatable", "filter")],
+    [State("time_df", "children")]
+)
+def alloy_thickness_page_callback(pagination_settings, sort_by, filter, df):
+    return table_page(df, 'ALLOYCODE', pagination_settings, sort_by, filter)
+
+
+@app.callback(
+    Output("width_thickness_datatable", "data"),
+    [Input("width_thickness_datatable", "pagination_settings"),
+     Input("width_thickness_datatable", "sort_by"),
+     Input("width_thickness_datatable", "filter")],
+    [State("time_df", "children")]
+)
+def width_thickness_page_callback(pagination_settings, sort_by, filter, df):
+    return table_page(df, 'ENTRYWIDTH', pagination_settings, sort_by, filter)
+
+
+@app.callback(
+    Output("exit_thickness_weight_datatable", "data"),
+    [Input("exit_thickness_weight_datatable", "pagination_settings"),
+     Input("exit_thickness_weight_datatable", "sort_by"),
+     Input("exit_thickness_weight_datatable", "filter")],
+    [State("time_df", "children")]
+)
+def exit_thickness_weight_page_callback(pagination_settings, sort_by, filter, df):
+    return table_page(df, 'EXITTHICK', pagination_settings, sort_by, filter)
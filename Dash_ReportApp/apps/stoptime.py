@@ -2,20 +2,33 @@
 
 from datetime import datetime as dt
 
+import dash
 import dash_core_components as dcc
 import dash_html_components as html
-import dash_table
-import numpy as np
+import downsample
+import export
+import intervals
 import pandas as pd
-from app import app, indicator, DB
-from dash.dependencies import Input, Output, State
+import paging
+import timeindex
+from app import app, indicator, STORE, FIGURES, REFRESH, SHARED
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
 from plotly import graph_objs as go
 
+# NPLANTTYPE of the three indicators: PL, TCM, PLTCM
+PLANTS = [1, 2, 3]
 
-def date_source(df):
+# seconds between two polls of the live mode
+LIVE_INTERVAL = 30
+
+
+# mean stop per day or per longer bucket (downsample.bar_frequency); the zoom of the user is
+# kept over updates until uirevision changes
+def date_source(df, freq='D', uirevision=None):
     types = df["DATE"]
     values = df["mean"]
-    data = [go.Bar(x=types, y=values,
+    data = [go.Bar(x=types, y=values, name=downsample.FREQUENCY_NAMES[freq],
                    orientation="v")]  # x could be any column value since its a count
 
     layout = go.Layout(
@@ -23,12 +36,29 @@ def date_source(df):
         margin=dict(l=210, r=25, b=20, t=0, pad=4),
         paper_bgcolor="white",
         plot_bgcolor="white",
+        uirevision=uirevision,
     )
 
     return {"data": data, "layout": layout}
 
 
-global_df = DB.get_stoptime()
+# [first day, day after the last) of the picked days, None where a side is open
+def day_window(start_date=None, end_date=None):
+    if start_date is not None:
+        start_date = pd.to_datetime(start_date).normalize()
+    if end_date is not None:
+        end_date = pd.to_datetime(end_date).normalize() + pd.Timedelta(days=1)
+    return start_date, end_date
+
+
+# date range view of the stop time data, registered as the STORE view of the stop times.
+# The frame is kept sorted by DTSTORE, so the picked days are a binary search slice sharing
+# the data of the full frame.
+def select_dates(df, start_date=None, end_date=None):
+    return timeindex.time_slice(df, 'DTSTORE', *day_window(start_date, end_date))
+
+
+STORE.register_filter('stoptime', select_dates)
 
 layout = [
 
@@ -45,6 +75,24 @@ layout = [
                 className="four columns",
             ),
             html.Div(html.Button(id='submit-button', n_clicks=0, children='Submit'), className="two columns"),
+            html.Div(
+                [
+                    html.A('CSV', id='stoptime_export_csv', href=export.export_url('stoptime', 'csv')),
+                    ' | ',
+                    html.A('Parquet', id='stoptime_export_parquet', href=export.export_url('stoptime', 'parquet')),
+                ],
+                className="two columns",
+            ),
+            html.Div(
+                dcc.Checklist(id='stop_live_toggle', options=[{'label': ' Live', 'value': 'live'}], value=[]),
+                className="two columns",
+            ),
+            dcc.Interval(id='stop_live_interval', interval=LIVE_INTERVAL * 1000, disabled=True),
+            # indicator and chart base of the picked days, and the latest live delta on top of it;
+            # stop_redraw asks for a new base when a refresh booked stops before the watermark
+            dcc.Store(id='stop_summary'),
+            dcc.Store(id='stop_live'),
+            dcc.Store(id='stop_redraw'),
         ],
         className="row",
         style={"marginBottom": "10"},
@@ -54,14 +102,14 @@ layout = [
     html.Div(
         [
             indicator(
-                "#00cc96", "Total Delay Duartion PL in Min", "left_PL_indicator"
+                "#00cc96", "Total Delay Duartion PL in Min (Availability)", "left_PL_indicator"
             ),
             indicator(
-                "#119DFF", "Total Delay Duartion TCM in Min", "middle_TCM_indicator"
+                "#119DFF", "Total Delay Duartion TCM in Min (Availability)", "middle_TCM_indicator"
             ),
             indicator(
                 "#EF553B",
-                "Total Delay Duartion PLTCM in Min",
+                "Total Delay Duartion PLTCM in Min (Availability)",
                 "right_PLTCM_indicator",
             ),
         ],
@@ -122,72 +170,64 @@ layout = [
      State("date-range", "end_date")]
 )
 def store_data(df, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
     if n_clicks > 0:
-        df_1 = df.set_index('DATE')
-        df = df_1.loc[start_date:end_date]
-        cleaned_df = df.reset_index()
-    else:
-        cleaned_df = df
-    return cleaned_df.to_json(orient="split")
+        return STORE.token('stoptime', start_date=start_date, end_date=end_date)
+    return STORE.token('stoptime')
 
 
-# updates left indicator based on df updates
+# download links for the picked days, all plants (add plant=1..3 to the link for one plant)
 @app.callback(
-    Output("left_PL_indicator", "children"),
-    [Input("parttime_df", "children"), Input('submit-button', 'n_clicks')],
-    [State("date-range", "start_date"),
-     State("date-range", "end_date")]
+    [Output('stoptime_export_csv', 'href'),
+     Output('stoptime_export_parquet', 'href')],
+    [Input('parttime_df', 'children')]
 )
-def left_leads_indicator_callback(df, n_clicks,start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    df_stats = df.groupby('PLANT')['DURATION'].sum()
-    return np.ceil(df_stats[1])
+def export_links_callback(df):
+    filters = STORE.filters(df)
+    return export.export_url('stoptime', 'csv', **filters), export.export_url('stoptime', 'parquet', **filters)
 
 
-# updates middle  indicator based on df updates
-@app.callback(
-    Output("middle_TCM_indicator", "children"),
-    [Input("parttime_df", "children"), Input('submit-button', 'n_clicks')],
-    [State("date-range", "start_date"),
-     State("date-range", "end_date")]
-)
-def left_leads_indicator_callback(df, n_clicks,start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    df_stats = df.groupby('PLANT')['DURATION'].sum()
-    return np.ceil(df_stats[2])
+# downtime minutes and availability per PLANT over the days of a stop time token, shared by
+# the three indicators
+def plant_downtime(token):
+    filters = STORE.filters(token)
+    return plant_downtime_view(filters.get('start_date'), filters.get('end_date'))
 
 
-# updates Right  indicator based on df updates
-@app.callback(
-    Output("right_PLTCM_indicator", "children"),
-    [Input("parttime_df", "children"), Input('submit-button', 'n_clicks')],
-    [State("date-range", "start_date"),
-     State("date-range", "end_date")]
-)
-def left_leads_indicator_callback(df, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    df_stats = df.groupby('PLANT')['DURATION'].sum()
-    return np.ceil(df_stats[3])
+# Overlapping stops of a plant count once and only the part of a stop inside the picked days
+# counts, so stops crossing midnight are split between the days. The stops are taken from the
+# whole history, not the DTSTORE view: a stop can be booked on another day than it ran.
+@FIGURES.memoize('stoptime', lambda: STORE.version('stoptime'))
+def plant_downtime_view(start_date, end_date):
+    df = STORE.get(STORE.token('stoptime'))
+    start, end = day_window(start_date, end_date)
+    return intervals.downtime(df, start=start, end=end).set_index('PLANT')
+
+
+# per day DURATION stats of a stop time token, shared by the table pages and the date chart
+def daily_stop_stats(token):
+    def describe(df):
+        stats = df.groupby('DATE')['DURATION'].describe().reset_index()
+        stats['DATE'] = stats['DATE'].dt.strftime('%Y-%m-%d')
+        return stats
+    return STORE.derive(token, 'daily_stop_stats', describe)
 
 
 # update table based on drop down value and df updates
 @app.callback(
     Output("stop_table", "children"),
-    [Input("parttime_df", "children"), Input("input-1", "value"), Input('submit-button', 'n_clicks')],
-    [State("date-range", "start_date"),
-     State("date-range", "end_date")]
+    [Input("parttime_df", "children"), Input("input-1", "value")]
 )
-def leads_table_callback(df, value, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    df = df.groupby('DATE')['DURATION'].describe().reset_index()
+def leads_table_callback(df, value):
+    filters = STORE.filters(df)
+    return stop_table_view(filters.get('start_date'), filters.get('end_date'))
 
-    datatable = dash_table.DataTable(
-        columns=[{"name": i, "id": i} for i in df.columns],
-        data=df.to_dict("rows"),
+
+@FIGURES.memoize('stoptime', lambda: STORE.version('stoptime'))
+def stop_table_view(start_date, end_date):
+    datatable = paging.paged_table(
+        'stop_datatable',
+        daily_stop_stats(STORE.token('stoptime', start_date=start_date, end_date=end_date)),
         n_fixed_rows=1,
-        # filtering=True,
-        sorting=True,
         style_cell={'width': '150px', 'padding': '5px', 'textAlign': 'center'},
         style_header={
             'backgroundColor': 'white',
@@ -206,17 +246,122 @@ def leads_table_callback(df, value, n_clicks, start_date, end_date):
     return datatable
 
 
-# update Bar chart figure df updates
+# page of the stop table for the current paging, sorting and filter
 @app.callback(
-    Output("date_analysis", "figure"),
-    [Input("parttime_df", "children"), Input('submit-button', 'n_clicks')],
-    [State("date-range", "start_date"),
-     State("date-range", "end_date")]
+    Output("stop_datatable", "data"),
+    [Input("stop_datatable", "pagination_settings"),
+     Input("stop_datatable", "sort_by"),
+     Input("stop_datatable", "filter")],
+    [State("parttime_df", "children")]
 )
-def by_date_source_callback(df, n_clicks, start_date, end_date):
-    df = pd.read_json(df, orient="split")
-    df = df.groupby('DATE')['DURATION'].describe().reset_index()
-    figure = date_source(df)
-    return figure
+def stop_table_page_callback(pagination_settings, sort_by, filter, df):
+    return paging.table_page(daily_stop_stats(df), pagination_settings, sort_by, filter)
 
 
+# Base of the indicators and the per day chart for the picked days. The browser renders both
+# from it (assets/stoptime_live.js) and adds the live deltas on top. Long ranges are charted per
+# week or longer; zooming in sends the x range of the zoom, charted again in finer buckets.
+# A live tick that finds late stops sets stop_redraw, and the base is computed again.
+@app.callback(
+    Output('stop_summary', 'data'),
+    [Input("parttime_df", "children"), Input('date_analysis', 'relayoutData'), Input('stop_redraw', 'data')]
+)
+def stop_summary_callback(df, relayout, redraw):
+    filters = STORE.filters(df)
+    return stop_summary_view(filters.get('start_date'), filters.get('end_date'), *downsample.zoom_range(relayout))
+
+
+@FIGURES.memoize('stoptime', lambda: STORE.version('stoptime'))
+def stop_summary_view(start_date, end_date, zoom_start=None, zoom_end=None):
+    token = STORE.token('stoptime', start_date=start_date, end_date=end_date)
+    view = STORE.get(token)
+    stats = daily_stop_stats(token)
+    if zoom_start is not None:
+        stats = stats[(stats['DATE'] >= zoom_start) & (stats['DATE'] < zoom_end)]
+    freq = downsample.bar_frequency(stats['DATE'].min(), stats['DATE'].max()) if len(stats) else 'D'
+    bars = downsample.bucket_bars(stats, 'DATE', freq, sums=['count'], means=['mean'], count='count')
+    if freq != 'D':
+        bars['DATE'] = bars['DATE'].dt.strftime('%Y-%m-%d')
+    summary = {
+        'token': token,
+        'watermark': str(view['DTSTORE'].iloc[-1]) if len(view) else None,
+        'rows': len(view),
+        'figure': date_source(bars, freq, uirevision=token),
+        'counts': bars['count'].tolist(),
+        'freq': freq,
+        'range': [zoom_start, zoom_end] if zoom_start is not None else None,
+    }
+    summary.update(plant_indicators(token))
+    return summary
+
+
+# indicator values of a token: downtime minutes and availability per plant as JSON
+def plant_indicators(token):
+    plants = plant_downtime(token)
+    return {
+        'plants': {str(plant): float(plants['DOWNTIME'].get(plant, 0)) for plant in PLANTS},
+        'availability': {str(plant): float(plants['AVAILABILITY'].get(plant, 1)) for plant in PLANTS},
+    }
+
+
+# polls only while the Live box is ticked
+@app.callback(Output('stop_live_interval', 'disabled'), [Input('stop_live_toggle', 'value')])
+def stop_live_toggle_callback(value):
+    return 'live' not in (value or [])
+
+
+# Live tick: refresh the stop times (at most once per LIVE_INTERVAL for all viewers; with the
+# shared cache only the leader queries, the other workers take over its snapshots) and send the
+# per day sums of the rows booked since the last watermark with the recomputed plant downtime.
+# Nothing is sent when there are no new rows. The summary and every delta count the rows they
+# cover; more rows at or before the watermark than that are stops a refresh booked late (the
+# LOOKBACK re-fetch), which no delta can add, so the summary is redrawn instead.
+@app.callback(
+    [Output('stop_live', 'data'), Output('stop_redraw', 'data')],
+    [Input('stop_live_interval', 'n_intervals')],
+    [State('stop_summary', 'data'), State('stop_live', 'data')]
+)
+def stop_live_callback(n_intervals, summary, last):
+    if not n_intervals or not summary:
+        raise PreventUpdate
+    (SHARED or REFRESH).poll('stoptime', LIVE_INTERVAL)
+    watermark, rows, seq = summary['watermark'], summary.get('rows'), 0
+    if last and last['token'] == summary['token']:
+        seq = last['seq']
+        # a summary drawn again after a zoom may already be past the last delta
+        if watermark is None or last['watermark'] > watermark:
+            watermark, rows = last['watermark'], last.get('rows')
+    view = STORE.get(summary['token'])
+    new_rows = timeindex.time_slice(view, 'DTSTORE', watermark, closed='right') if watermark else view
+    if rows is not None and len(view) - len(new_rows) > rows:
+        return dash.no_update, {'token': summary['token'], 'rows': len(view)}
+    delta = live_delta(new_rows)
+    if delta is None:
+        raise PreventUpdate
+    delta.update(plant_indicators(summary['token']), token=summary['token'], seq=seq + 1, rows=len(view))
+    return delta, dash.no_update
+
+
+# per day DURATION count and sum of the rows booked after the watermark, a binary search slice
+# at the end of the DTSTORE sorted frame
+def live_delta(new_rows):
+    if new_rows.empty:
+        return None
+    days = new_rows.groupby('DATE')['DURATION'].agg(['count', 'sum'])
+    return {
+        'watermark': str(new_rows['DTSTORE'].iloc[-1]),
+        'days': {
+            day.strftime('%Y-%m-%d'): [int(count), float(total)]
+            for day, count, total in zip(days.index, days['count'], days['sum'])
+        },
+    }
+
+
+app.clientside_callback(
+    ClientsideFunction('stoptime', 'mergeLive'),
+    [Output("left_PL_indicator", "children"),
+     Output("middle_TCM_indicator", "children"),
+     Output("right_PLTCM_indicator", "children"),
+     Output("date_analysis", "figure")],
+    [Input('stop_summary', 'data'), Input('stop_live', 'data')]
+)
@@ -0,0 +1,54 @@
+// Indicators, thickness chart and export links of the Production tab, drawn from the
+// production_kpis store. The store is filled once per date range by production_callback; moving
+// the thickness slider only runs these functions.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    production: {
+        // coil count, total weight in t and weight per coil in kg
+        indicators: function (summary) {
+            if (!summary) {
+                return ['', '', ''];
+            }
+            var coils = summary.coils;
+            var weight = summary.weight;
+            return [coils, Math.floor(weight / 1000), coils > 0 ? Math.floor(weight / coils) : 0];
+        },
+
+        // bars of the exit thicknesses up to the slider's upper value
+        thickness: function (summary, value) {
+            if (!summary) {
+                return {data: [], layout: {}};
+            }
+            var figure = summary.thickness;
+            var bar = figure.data[0] || {};
+            var x = [], y = [];
+            (bar.y || []).forEach(function (thick, i) {
+                if (!value || thick <= value[1]) {
+                    y.push(thick);
+                    x.push(bar.x[i]);
+                }
+            });
+            return {data: [Object.assign({}, bar, {x: x, y: y})], layout: figure.layout};
+        },
+
+        // query string of export.export_url(): sorted keys, None values left out
+        exportUrl: function (name, fmt, filters) {
+            var query = Object.keys(filters).sort().filter(function (key) {
+                return filters[key] !== null && filters[key] !== undefined;
+            }).map(function (key) {
+                return encodeURIComponent(key) + '=' + encodeURIComponent(filters[key]).replace(/%20/g, '+');
+            }).join('&');
+            return '/export/' + name + '.' + fmt + (query ? '?' + query : '');
+        },
+
+        exportLinks: function (summary, value) {
+            var filters = Object.assign({}, summary ? summary.filters : {});
+            if (value) {
+                filters.min_thick = value[0];
+                filters.max_thick = value[1];
+            }
+            var production = window.dash_clientside.production;
+            return [production.exportUrl('production', 'csv', filters),
+                    production.exportUrl('production', 'parquet', filters)];
+        }
+    }
+});
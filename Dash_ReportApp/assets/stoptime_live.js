@@ -0,0 +1,97 @@
+// Indicators and per day chart of the Stop Times tab, rendered from the stop_summary store.
+// In live mode the stop_live store carries the per day sums of the newly booked stops, added
+// here to the per day means kept in the browser, and the recomputed plant downtime (overlapping
+// stops count once, so it is not a sum of deltas). Long ranges are charted per week or longer
+// (summary.freq), new days are added to the bar of their bucket. Stops booked before the
+// watermark are not sent as deltas, the server draws a new summary for them (stop_redraw).
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    stoptime: {
+        _state: null,
+
+        // first day of the bucket of a 'YYYY-MM-DD' day, like pandas period start times
+        bucketOf: function (day, freq) {
+            if (freq === 'W') {  // weeks start on Monday
+                var date = new Date(day + 'T00:00:00Z');
+                date.setUTCDate(date.getUTCDate() - (date.getUTCDay() + 6) % 7);
+                return date.toISOString().slice(0, 10);
+            }
+            var month = parseInt(day.slice(5, 7), 10);
+            if (freq === 'M') {
+                return day.slice(0, 8) + '01';
+            }
+            if (freq === 'Q') {
+                month = month - (month - 1) % 3;
+                return day.slice(0, 5) + (month < 10 ? '0' : '') + month + '-01';
+            }
+            if (freq === 'A') {
+                return day.slice(0, 5) + '01-01';
+            }
+            return day;
+        },
+
+        mergeLive: function (summary, live) {
+            if (!summary) {
+                return ['', '', '', {data: [], layout: {}}];
+            }
+            var stoptime = window.dash_clientside.stoptime;
+            var state = stoptime._state;
+            var key = JSON.stringify([summary.token, summary.watermark, summary.freq, summary.range]);
+            if (!state || state.key !== key) {
+                var bar = summary.figure.data[0] || {};
+                // a summary drawn again (zoom) already holds the deltas up to its watermark
+                var seen = live && live.token === summary.token && live.watermark <= summary.watermark;
+                state = {
+                    key: key,
+                    token: summary.token,
+                    seq: seen ? live.seq : 0,
+                    plants: summary.plants,
+                    availability: summary.availability,
+                    x: (bar.x || []).slice(),
+                    y: (bar.y || []).slice(),
+                    counts: summary.counts.slice()
+                };
+                stoptime._state = state;
+            }
+
+            if (live && live.token === state.token && live.seq > state.seq) {
+                state.plants = live.plants;
+                state.availability = live.availability;
+                Object.keys(live.days).forEach(function (day) {
+                    var range = summary.range;
+                    if (range && (day < range[0] || day >= range[1])) {  // outside the zoom, end left out
+                        return;
+                    }
+                    var count = live.days[day][0];
+                    var total = live.days[day][1];
+                    day = stoptime.bucketOf(day, summary.freq || 'D');
+                    var i = state.x.indexOf(day);
+                    if (i < 0) {  // first stop of a bucket, buckets stay in order
+                        i = 0;
+                        while (i < state.x.length && state.x[i] < day) {
+                            i++;
+                        }
+                        state.x.splice(i, 0, day);
+                        state.y.splice(i, 0, 0);
+                        state.counts.splice(i, 0, 0);
+                    }
+                    var sum = state.y[i] * state.counts[i] + total;
+                    state.counts[i] += count;
+                    state.y[i] = sum / state.counts[i];
+                });
+                state.seq = live.seq;
+            }
+
+            var indicator = function (plant) {
+                var share = state.availability[plant];
+                return Math.ceil(state.plants[plant] || 0) + ' (' + (100 * (share === undefined ? 1 : share)).toFixed(1) + '%)';
+            };
+            var trace = Object.assign({}, summary.figure.data[0], {x: state.x.slice(), y: state.y.slice()});
+            return [
+                indicator('1'),
+                indicator('2'),
+                indicator('3'),
+                {data: [trace], layout: summary.figure.layout}
+            ];
+        }
+    }
+});
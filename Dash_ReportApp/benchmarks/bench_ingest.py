@@ -0,0 +1,69 @@
+# Production extract ingest: pd.read_sql_query + the former whole-frame cleanup
+# (replace/apply(np.round)/ffill) vs DB.query streaming typed fetchmany batches + clean_production.
+# Reports wall time and, in a second run, the tracemalloc peak on a seeded SQLite database.
+# Run from Dash_ReportApp:  python -m benchmarks.bench_ingest [10000,100000,1000000] [arraysize]
+import contextlib
+import io
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from DBManager import DB, SQLiteBackend, PRODUCTION_SCHEMA
+from benchmarks.bench_production_query import NEW_QUERY, database
+
+
+def legacy_ingest(path):
+    conn = sqlite3.connect(path)
+    try:
+        df = pd.read_sql_query(NEW_QUERY, conn)
+    finally:
+        conn.close()
+    df = df.replace('', np.nan)
+    df['DTENDROLLING'] = pd.to_datetime(df['DTENDROLLING'])
+    df.loc[df.EXITWEIGHTMEAS == 0, 'EXITWEIGHTMEAS'] = df['EXITWEIGHTMEAS'].mean(skipna=True)
+    df['EXITWEIGHTMEAS'] = df['EXITWEIGHTMEAS'].apply(lambda x: np.round(x, decimals=2))
+    df.fillna(method='ffill', inplace=True)
+    return df
+
+
+def streaming_ingest(db):
+    df = db.query(NEW_QUERY, schema=PRODUCTION_SCHEMA)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return db.clean_production(df)
+
+
+# tracing slows allocations down a lot, so time and peak memory come from separate runs
+def measure(fn):
+    started = time.perf_counter()
+    df = fn()
+    seconds = time.perf_counter() - started
+    del df
+    tracemalloc.start()
+    df = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, df
+
+
+def main(sizes='10000,100000,1000000', arraysize=10000):
+    print('{:>9} {:>11} {:>11} {:>14} {:>14} {:>11} {:>11}'.format(
+        'coils', 'legacy [s]', 'stream [s]', 'legacy pk [MB]', 'stream pk [MB]', 'legacy [MB]', 'stream [MB]'))
+    for n in [int(size) for size in sizes.split(',')]:
+        path = database(n)
+        db = DB(SQLiteBackend(path), pool_size=1, arraysize=int(arraysize))
+        legacy = measure(lambda: legacy_ingest(path))
+        stream = measure(lambda: streaming_ingest(db))
+        db.pool.close()
+        assert len(legacy[2]) == len(stream[2]) == n, 'ingest paths return different rows'
+        assert np.allclose(legacy[2]['EXITWEIGHTMEAS'].sum(), stream[2]['EXITWEIGHTMEAS'].sum())
+        print('{:>9} {:>11.3f} {:>11.3f} {:>14.1f} {:>14.1f} {:>11.1f} {:>11.1f}'.format(
+            n, legacy[0], stream[0], legacy[1] / 1e6, stream[1] / 1e6,
+            legacy[2].memory_usage(deep=True).sum() / 1e6, stream[2].memory_usage(deep=True).sum() / 1e6))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,108 @@
+# RefreshEngine.load() with one worker (datasets one after the other) vs LOAD_WORKERS (concurrently)
+# against a seeded SQLite file, next to the time of each dataset alone.
+# The production dataset uses the SQLite flavour of its query (no FROM_TZ/CAST AS DATE).
+# SQLite runs in process, so exec_ms / fetch_ms add the server and network time a plant DB query
+# spends waiting (execute and every fetchmany round trip); with 0/0 the load is pure CPU.
+# Run from Dash_ReportApp:
+#   python -m benchmarks.bench_parallel_load [coils] [stop_copies] [exec_ms] [fetch_ms] [repeats]
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import time
+
+import pandas as pd
+
+import DBManager
+from DBManager import DB, SQLiteBackend, RefreshEngine, LOAD_WORKERS
+from benchmarks.bench_production_query import NEW_QUERY, database
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Dataset', 'STOP_TIME_TAB.csv')
+
+
+# the production tables plus STOP_TIME_TAB.csv repeated copies times, each copy shifted by
+# 1500 days, so both datasets take a comparable time to load
+def stoptime_database(n, copies):
+    path = database(n)
+    conn = sqlite3.connect(path)
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    if 'STOP_TIME_TAB_{}'.format(copies) not in tables:
+        stops = pd.read_csv(CSV_PATH, parse_dates=['DTSTART', 'DTEND', 'DTSTORE'])
+        shifted = []
+        for k in range(copies):
+            copy = stops.copy()
+            for col in ['DTSTART', 'DTEND', 'DTSTORE']:
+                copy[col] = copy[col] + pd.Timedelta(days=1500 * k)
+            shifted.append(copy)
+        pd.concat(shifted).to_sql('STOP_TIME_TAB', conn, if_exists='replace', index=False, chunksize=50000)
+        conn.execute('CREATE TABLE STOP_TIME_TAB_{} (N INTEGER)'.format(copies))
+        conn.commit()
+    conn.close()
+    return path
+
+
+# SQLite backend whose cursors wait like a remote database would
+class RemoteLikeBackend(SQLiteBackend):
+
+    def __init__(self, path, exec_ms, fetch_ms):
+        SQLiteBackend.__init__(self, path)
+        self.exec_seconds = exec_ms / 1000.0
+        self.fetch_seconds = fetch_ms / 1000.0
+
+    def cursor(self, conn, arraysize, prefetchrows):
+        return RemoteLikeCursor(SQLiteBackend.cursor(self, conn, arraysize, prefetchrows), self)
+
+
+class RemoteLikeCursor:
+
+    def __init__(self, cursor, backend):
+        self.cursor = cursor
+        self.backend = backend
+
+    def execute(self, query, params):
+        time.sleep(self.backend.exec_seconds)
+        return self.cursor.execute(query, params)
+
+    def fetchmany(self):
+        time.sleep(self.backend.fetch_seconds)
+        return self.cursor.fetchmany()
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    def close(self):
+        self.cursor.close()
+
+
+def timed(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(coils=300000, stop_copies=60, exec_ms=2000, fetch_ms=20, repeats=3):
+    path = stoptime_database(int(coils), int(stop_copies))
+    DBManager.QUERIES['production'] = (NEW_QUERY, [])
+    db = DB(RemoteLikeBackend(path, float(exec_ms), float(fetch_ms)), pool_size=LOAD_WORKERS)
+
+    alone = {name: timed(lambda: RefreshEngine(db, workers=1).load_dataset(name), int(repeats))
+             for name in RefreshEngine.DATASETS}
+    sequential = timed(lambda: RefreshEngine(db, workers=1).load(), int(repeats))
+    parallel = timed(lambda: RefreshEngine(db, workers=LOAD_WORKERS).load(), int(repeats))
+
+    for name, seconds in alone.items():
+        print('{:<22} {:>8.3f}s'.format(name + ' alone', seconds))
+    print('{:<22} {:>8.3f}s'.format('sum', sum(alone.values())))
+    print('{:<22} {:>8.3f}s'.format('load, 1 worker', sequential))
+    print('{:<22} {:>8.3f}s'.format('load, {} workers'.format(LOAD_WORKERS), parallel))
+    print('pool stats:', db.pool_stats())
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,49 @@
+# Connect-per-query vs pooled sessions against the SQLite stand-in.
+# Run from Dash_ReportApp:  python -m benchmarks.bench_pool [queries] [threads]
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from DBManager import DB, SQLiteBackend
+
+QUERY = 'SELECT NPLANTTYPE, COUNT(*) AS N FROM STOP_TIME_TAB GROUP BY NPLANTTYPE'
+CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Dataset', 'STOP_TIME_TAB.csv')
+
+
+def run(fn, queries, threads):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda _: fn(), range(queries)))
+    return time.perf_counter() - started
+
+
+def main(queries=2000, threads=8):
+    path = os.path.join(tempfile.mkdtemp(), 'bench_pool.db')
+    backend = SQLiteBackend(path)
+    backend.load_csv('STOP_TIME_TAB', CSV_PATH)
+
+    # what DB.query did before the pool existed
+    def connect_per_query():
+        conn = backend.connect()
+        try:
+            return pd.read_sql_query(con=conn, sql=QUERY)
+        finally:
+            conn.close()
+
+    db = DB(backend=backend, pool_size=threads)
+    unpooled = run(connect_per_query, queries, threads)
+    pooled = run(lambda: db.query(QUERY), queries, threads)
+
+    print('{} queries on {} threads'.format(queries, threads))
+    print('connect per query: {:.3f}s ({:.2f} ms/query)'.format(unpooled, 1000 * unpooled / queries))
+    print('pooled sessions:   {:.3f}s ({:.2f} ms/query)'.format(pooled, 1000 * pooled / queries))
+    print('pool stats:', db.pool_stats())
+    db.pool.close()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
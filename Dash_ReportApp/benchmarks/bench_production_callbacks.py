@@ -0,0 +1,69 @@
+# Latency of one Production tab update: the former nine callbacks, each parsing the time_df JSON
+# and running its own groupby().describe(), vs the single aggregation stage in rollup.py.
+# Run from Dash_ReportApp:  python -m benchmarks.bench_production_callbacks [10000,100000] [repeats]
+import math
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import rollup
+from benchmarks.synthetic import production_frame
+
+
+# what the nine callbacks computed before, one JSON parse each
+def legacy_update(time_df):
+    df = pd.read_json(time_df, orient="split")
+    len(df)
+    df = pd.read_json(time_df, orient="split")
+    math.floor((df['EXITWEIGHTMEAS'].aggregate(sum)) / 1000)
+    df = pd.read_json(time_df, orient="split")
+    if len(df) > 0:
+        math.floor(df['EXITWEIGHTMEAS'].aggregate(sum) / len(df))
+    df = pd.read_json(time_df, orient="split")
+    df.groupby('ALLOYCODE')['EXITTHICK'].describe().reset_index()
+    df = pd.read_json(time_df, orient="split")
+    np.round(df.groupby('Date')['EXITWEIGHTMEAS'].sum().reset_index().EXITWEIGHTMEAS / 1000)
+    df = pd.read_json(time_df, orient="split")
+    df.groupby('ENTRYWIDTH')['EXITTHICK'].describe().reset_index()
+    df = pd.read_json(time_df, orient="split")
+    df.groupby('EXITTHICK')['EXITWEIGHTMEAS'].describe().reset_index()
+    df = pd.read_json(time_df, orient="split")
+    df.groupby('ALLOYCODE')['EXITTHICK'].describe()
+    df = pd.read_json(time_df, orient="split")
+    df.groupby('ENTRYWIDTH')['EXITTHICK'].describe()
+    df = pd.read_json(time_df, orient="split")
+    df.groupby('EXITTHICK')['EXITWEIGHTMEAS'].describe()
+
+
+# the aggregation stage behind production_callback and daily_weight_callback
+def pipeline_update(df):
+    cells = rollup.production_cells(df)
+    rollup.totals(cells)
+    rollup.daily_weight(cells)
+    rollup.thickness_by(cells, 'ALLOYCODE')
+    rollup.thickness_by(cells, 'ENTRYWIDTH')
+    rollup.weight_by_thickness(cells)
+
+
+def best_of(fn, arg, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(sizes='10000,100000', repeats=3):
+    print('{:>8} {:>12} {:>12} {:>8}'.format('coils', 'before [ms]', 'after [ms]', 'speedup'))
+    for n in [int(size) for size in sizes.split(',')]:
+        df = production_frame(n)
+        before = best_of(legacy_update, df.to_json(orient="split"), int(repeats))
+        after = best_of(pipeline_update, df, int(repeats))
+        print('{:>8} {:>12.1f} {:>12.1f} {:>7.1f}x'.format(n, 1000 * before, 1000 * after, before / after))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
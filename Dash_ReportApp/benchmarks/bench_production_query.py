@@ -0,0 +1,59 @@
+# Old (two correlated RESULT_ZONE_TAB subqueries per coil) vs new (one outer join on the
+# zone-1 rows) shape of the get_production query, on a seeded SQLite database.
+# Run from Dash_ReportApp:  python -m benchmarks.bench_production_query [10000,100000,1000000] [repeats]
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from DBManager import PRODUCTION_FROM
+from benchmarks.synthetic import seed_sqlite
+
+# the Oracle select list without the TO_CHAR/FROM_TZ formatting SQLite does not have
+SELECT = """
+                SELECT  PT.COILIDOUT AS COILIDOUT,PT.COILIDIN_1 AS COILIDIN,PT.ALLOYCODE AS ALLOYCODE,PT.ENTRYTHICK,
+                round(PT.EXITTHICK,2) as EXITTHICK , OT.ENTRYWIDTH,PT.ENTRYDIAMPDI,PT.EXITWEIGHTCALC as EXITWEIGHTMEAS,
+                PT.DTWELDED AS DTSTARTROLL, PT.DTDEPARTURE AS DTDEPARTURE, PT.DTENDROLLING AS DTENDROLLING,"""
+
+OLD_QUERY = SELECT + """
+                (SELECT RZT.LENGTHPHASEEXIT FROM RESULT_ZONE_TAB RZT WHERE COILIDOUT = PT.COILIDOUT AND NZONE = 1) AS LENGTHPHASEEXIT,
+                (SELECT RZT.LENGTHTHICKTOL FROM RESULT_ZONE_TAB RZT WHERE COILIDOUT = PT.COILIDOUT AND NZONE = 1) AS LENGTHTHICKTOL
+                FROM PRODUCTION_TAB PT, ORDER_TAB OT WHERE PT.COILIDIN_1 = OT.COILID AND PT.ALLOYCODE = OT.ALLOYCODE
+             """
+
+NEW_QUERY = SELECT + """
+                RZT.LENGTHPHASEEXIT AS LENGTHPHASEEXIT, RZT.LENGTHTHICKTOL AS LENGTHTHICKTOL""" + PRODUCTION_FROM
+
+
+def database(n, seed=0):
+    path = os.path.join(tempfile.gettempdir(), 'bi_dash_bench_{}_{}.db'.format(n, seed))
+    if not os.path.exists(path):
+        conn = sqlite3.connect(path)
+        seed_sqlite(conn, n, seed)
+        conn.close()
+    return path
+
+
+def best_of(conn, query, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = conn.execute(query).fetchall()
+        timings.append(time.perf_counter() - started)
+    return min(timings), rows
+
+
+def main(sizes='10000,100000,1000000', repeats=3):
+    print('{:>9} {:>10} {:>10} {:>8}'.format('coils', 'old [s]', 'new [s]', 'speedup'))
+    for n in [int(size) for size in sizes.split(',')]:
+        conn = sqlite3.connect(database(n))
+        old, old_rows = best_of(conn, OLD_QUERY, int(repeats))
+        new, new_rows = best_of(conn, NEW_QUERY, int(repeats))
+        conn.close()
+        assert sorted(old_rows) == sorted(new_rows), 'query shapes return different rows'
+        print('{:>9} {:>10.3f} {:>10.3f} {:>7.1f}x'.format(n, old, new, old / new))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,84 @@
+# Memory of N worker processes holding the production dataset: each with its own copy (what every
+# worker loading from the DB ends up with) vs attached to one shared snapshot (sharedcache.py).
+# All workers hold the data at the same time; PSS splits the shared pages between them.
+# Run from Dash_ReportApp:  python -m benchmarks.bench_shared_cache [coils] [workers]
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+import time
+
+from DBManager import PRODUCTION_SCHEMA, RefreshEngine, apply_schema
+from benchmarks.synthetic import production_rows
+from sharedcache import SharedCache
+
+
+# proportional and private (unshared) memory of this process in MB
+def memory():
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Pss', 'Private_Clean', 'Private_Dirty'):
+                values[key] = int(rest.split()[0]) / 1024
+    return values['Pss'], values['Private_Clean'] + values['Private_Dirty']
+
+
+def worker(mode, path, copy_file, barrier, results):
+    before = memory()
+    if mode == 'shared':
+        engine = RefreshEngine(None)
+        SharedCache(engine, path).attach('production')
+        frame = engine.frames['production']
+    else:
+        with open(copy_file, 'rb') as f:
+            frame = pickle.load(f)
+    for col in frame.columns:  # touch the columns like the callbacks do
+        if frame[col].dtype.kind in 'fi':
+            frame[col].sum()
+    barrier.wait()
+    after = memory()
+    results.put((after[0] - before[0], after[1] - before[1]))
+    barrier.wait()
+
+
+def run(mode, workers, path, copy_file):
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(mode, path, copy_file, barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measured = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return sum(m[0] for m in measured), sum(m[1] for m in measured)
+
+
+def main(n=1000000, workers=4):
+    n, workers = int(n), int(workers)
+    path = '/dev/shm/bi_dash_bench_{}'.format(os.getpid())
+    copy_file = os.path.join(path, 'production.pkl')
+    frame = apply_schema(production_rows(n), PRODUCTION_SCHEMA)
+    try:
+        cache = SharedCache(RefreshEngine(None), path)
+        started = time.perf_counter()
+        cache.publish('production', frame, frame)
+        print('snapshot of {} coils written in {:.2f}s'.format(n, time.perf_counter() - started))
+        with open(copy_file, 'wb') as f:
+            pickle.dump(frame, f)
+        del frame
+
+        print('{:>8} {:>10} {:>14} {:>18}'.format('workers', 'mode', 'sum PSS [MB]', 'sum private [MB]'))
+        for count in range(1, workers + 1):
+            for mode in ('private', 'shared'):
+                pss, private = run(mode, count, path, copy_file)
+                print('{:>8} {:>10} {:>14.0f} {:>18.0f}'.format(count, mode, pss, private))
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
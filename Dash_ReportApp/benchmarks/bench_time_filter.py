@@ -0,0 +1,51 @@
+# Date range selection on the production frame: the former re-parse + boolean mask in
+# filter_data vs a binary search slice of the pre-sorted, pre-parsed DTENDROLLING column.
+# Run from Dash_ReportApp:  python -m benchmarks.bench_time_filter [1000000,5000000] [repeats]
+import sys
+import time
+
+import pandas as pd
+
+import timeindex
+from benchmarks.synthetic import production_frame
+
+# the string format DTENDROLLING used to come back in
+DTENDROLLING_FORMAT = '%m.%d.%y %H:%M'
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(sizes='1000000,5000000', repeats=5):
+    repeats = int(repeats)
+    print('{:>9} {:>16} {:>12} {:>12}'.format('coils', 'parse+mask [ms]', 'mask [ms]', 'slice [ms]'))
+    for n in [int(size) for size in sizes.split(',')]:
+        df = production_frame(n)
+        # a month in the middle of the history
+        start = df['DTENDROLLING'].iloc[n // 2].normalize()
+        end = start + pd.Timedelta(days=30)
+        text = df.assign(DTENDROLLING=df['DTENDROLLING'].dt.strftime(DTENDROLLING_FORMAT))
+
+        def parse_and_mask():
+            times = pd.to_datetime(text['DTENDROLLING'], format=DTENDROLLING_FORMAT)
+            return text.loc[(times > start) & (times <= end)]
+
+        def mask():
+            return df.loc[(df['DTENDROLLING'] > start) & (df['DTENDROLLING'] <= end)]
+
+        def slice_():
+            return timeindex.time_slice(df, 'DTENDROLLING', start, end, closed='right')
+
+        assert len(mask()) == len(slice_())
+        print('{:>9} {:>16.2f} {:>12.2f} {:>12.3f}'.format(
+            n, 1000 * best_of(parse_and_mask, 1), 1000 * best_of(mask, repeats), 1000 * best_of(slice_, repeats)))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
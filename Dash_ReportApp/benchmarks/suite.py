@@ -0,0 +1,254 @@
+# Benchmark suite of the dashboard at growing PRODUCTION_TAB / STOP_TIME_TAB sizes.
+# For each size it generates seeded coils and stop events, runs the DBManager post-processing on
+# them, loads the result into the app's STORE and CUBE and calls every Production and Stop Times
+# callback through the Dash callback map (JSON encoding of the response included). Each timing
+# is the best of a few cold runs: the figure cache and the STORE views are dropped before every
+# call. Peak memory is traced in a separate run, tracemalloc slows the code it watches.
+#
+# Run from Dash_ReportApp:
+#   python -m benchmarks.suite                       compare with benchmarks/baseline.json
+#   python -m benchmarks.suite 10000,100000 --save   write a new baseline
+#   python -m benchmarks.suite 1000000,5000000 --repeats 1   the large sizes, minutes and a few GB each
+# Exits with 1 when a timing or peak memory grew by more than the tolerance against the baseline.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+os.environ['BI_DASH_SOURCE'] = 'csv'  # the app is imported without a database connection
+
+import numpy as np
+import pandas as pd
+
+import intervals
+import timeindex
+from DBManager import PRODUCTION_SCHEMA, STOPTIME_SCHEMA, apply_schema
+from app import DB, STORE, CUBE, FIGURES, COILS, STOP_COILS
+from apps import coilreport, production, stoptime
+from benchmarks.synthetic import production_rows, stop_events
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SIZES = '10000,100000'
+
+# relative growth reported as a regression, and the absolute floors below which
+# differences are noise
+TOLERANCE = 0.5
+MIN_SECONDS = 0.005
+MIN_MB = 1.0
+
+PAGE = {'current_page': 0, 'page_size': 25}
+
+
+# the callbacks of all tabs with the arguments the page sends for the whole history. The module
+# attributes are the callbacks as Dash registered them, returning the JSON response.
+def callback_cases():
+    production_handle = STORE.handle('production')
+    stoptime_handle = STORE.handle('stoptime')
+
+    def time_df():
+        return production.update_output(production_handle, 0, None, None)
+
+    def parttime_df():
+        return stoptime.store_data(stoptime_handle, 0, None, None)
+
+    def token(response):
+        return json.loads(response)['response']['props']['children']
+
+    def coil_id():
+        coils = STORE.get(production_handle)['COILIDOUT']
+        return coils.iat[len(coils) // 2]
+
+    return [
+        ('production.update_output', lambda: (production_handle, 0, None, None), production.update_output),
+        ('production.production_callback',
+         lambda: (token(time_df()),), production.production_callback),
+        ('production.daily_weight_callback',
+         lambda: (token(time_df()), None), production.daily_weight_callback),
+        ('production.alloy_thickness_page_callback',
+         lambda: (PAGE, [], '', token(time_df())), production.alloy_thickness_page_callback),
+        ('production.width_thickness_page_callback',
+         lambda: (PAGE, [], '', token(time_df())), production.width_thickness_page_callback),
+        ('production.exit_thickness_weight_page_callback',
+         lambda: (PAGE, [], '', token(time_df())), production.exit_thickness_weight_page_callback),
+        ('stoptime.store_data', lambda: (stoptime_handle, 0, None, None), stoptime.store_data),
+        ('stoptime.stop_summary_callback',
+         lambda: (token(parttime_df()), None, None), stoptime.stop_summary_callback),
+        ('stoptime.leads_table_callback',
+         lambda: (token(parttime_df()), ''), stoptime.leads_table_callback),
+        ('stoptime.stop_table_page_callback',
+         lambda: (PAGE, [], '', token(parttime_df())), stoptime.stop_table_page_callback),
+        ('coilreport.coil_suggestions_callback',
+         lambda: (coil_id()[:-2],), coilreport.coil_suggestions_callback),
+        ('coilreport.coil_record_callback',
+         lambda: (coil_id(), production_handle), coilreport.coil_record_callback),
+        ('coilreport.coil_stops_callback',
+         lambda: (coil_id(), stoptime_handle), coilreport.coil_stops_callback),
+    ]
+
+
+# raw query results of n coils and n stop events, typed like DB.stream returns them
+def raw_frames(n, seed=0):
+    return (apply_schema(production_rows(n, seed), PRODUCTION_SCHEMA),
+            apply_schema(stop_events(n, seed), STOPTIME_SCHEMA))
+
+
+# the post-processing of a full load, as RefreshEngine runs it
+def post_processing_cases(raw_production, raw_stoptime):
+    return [
+        ('DBManager.clean_production', lambda: (raw_production.copy(),), DB.clean_production),
+        ('DBManager.derive_stoptime', lambda: (raw_stoptime.copy(),), DB.derive_stoptime),
+    ]
+
+
+# drop everything the callbacks cache so that the next call computes from the frames
+def reset(frames):
+    for name, frame in frames.items():
+        STORE.put(name, frame)
+        FIGURES.invalidate(name)
+
+
+def quiet(fn, args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+# best time of repeats calls, each after prepare(); prepare() is not timed
+def best_of(fn, make_args, repeats, prepare=None):
+    timings = []
+    for _ in range(repeats):
+        if prepare is not None:
+            prepare()
+        args = make_args()
+        started = time.perf_counter()
+        quiet(fn, args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+# peak traced allocation of one call in MB, above what was allocated before it
+def peak_mb(fn, make_args, prepare=None):
+    if prepare is not None:
+        prepare()
+    args = make_args()
+    tracemalloc.start()
+    try:
+        quiet(fn, args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def measure(fn, make_args, repeats, prepare=None):
+    return {
+        'seconds': round(best_of(fn, make_args, repeats, prepare), 6),
+        'peak_mb': round(peak_mb(fn, make_args, prepare), 2),
+    }
+
+
+def run_size(n, repeats):
+    results = {}
+    raw_production, raw_stoptime = raw_frames(n)
+    for name, make_args, fn in post_processing_cases(raw_production, raw_stoptime):
+        results[name] = measure(fn, make_args, repeats)
+
+    frames = {
+        'production': timeindex.sort_by_time(quiet(DB.clean_production, (raw_production,)), 'DTENDROLLING'),
+        'stoptime': timeindex.sort_by_time(quiet(DB.derive_stoptime, (raw_stoptime,)), 'DTSTORE'),
+    }
+    results['rollup.ProductionCube.build'] = measure(CUBE.build, lambda: (frames['production'],), repeats)
+    results['intervals.downtime'] = measure(
+        intervals.downtime, lambda: (frames['stoptime'], 'PLANT', None, None, 'D'), repeats)
+    CUBE.build(frames['production'])
+    results['coilindex.CoilIndex.refresh'] = measure(
+        COILS.refresh, lambda: (frames['production'], frames['production']), repeats)
+    COILS.refresh(frames['production'], frames['production'])
+    STOP_COILS.refresh(frames['stoptime'], frames['stoptime'])
+
+    for name, make_args, fn in callback_cases():
+        results[name] = measure(fn, make_args, repeats, prepare=lambda: reset(frames))
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+    }
+
+
+# rows of the timings that grew past the tolerance, as (size, case, measure, baseline, now)
+def regressions(results, baseline, tolerance=TOLERANCE):
+    found = []
+    floors = {'seconds': MIN_SECONDS, 'peak_mb': MIN_MB}
+    for size, cases in results.items():
+        for case, values in cases.items():
+            before = baseline.get(size, {}).get(case)
+            if before is None:
+                continue
+            for key, floor in floors.items():
+                if values[key] > before[key] * (1 + tolerance) and values[key] - before[key] > floor:
+                    found.append((size, case, key, before[key], values[key]))
+    return found
+
+
+def report(results, baseline):
+    print('{:>8} {:<45} {:>10} {:>10} {:>10} {:>10}'.format(
+        'rows', 'case', 'time [ms]', 'base [ms]', 'peak [MB]', 'base [MB]'))
+    for size, cases in results.items():
+        for case, values in cases.items():
+            before = baseline.get(size, {}).get(case, {})
+            print('{:>8} {:<45} {:>10.1f} {:>10} {:>10.1f} {:>10}'.format(
+                size, case, 1000 * values['seconds'],
+                '-' if 'seconds' not in before else '{:.1f}'.format(1000 * before['seconds']),
+                values['peak_mb'],
+                '-' if 'peak_mb' not in before else '{:.1f}'.format(before['peak_mb'])))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite')
+    parser.add_argument('sizes', nargs='?', default=SIZES, help='comma separated row counts')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for n in [int(size) for size in args.sizes.split(',')]:
+        results[str(n)] = run_size(n, args.repeats)
+
+    saved = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            saved = json.load(f)
+    baseline = saved.get('results', {})
+    report(results, baseline)
+
+    if args.save:
+        merged = dict(baseline)
+        merged.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'environment': environment(), 'results': merged}, f, indent=2, sort_keys=True)
+        print('baseline written to {}'.format(args.baseline))
+        return 0
+
+    if saved.get('environment') and saved['environment'] != environment():
+        print('baseline was recorded on {}, timings may not compare'.format(saved['environment']))
+    found = regressions(results, baseline, args.tolerance)
+    for size, case, key, before, now in found:
+        print('REGRESSION {} rows {} {}: {:.3f} -> {:.3f}'.format(size, case, key, before, now))
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+# Seeded generators for plant-like data, used by the benchmarks instead of the plant DB.
+# Run from Dash_ReportApp to write a directory of exports for BI_DASH_SOURCE=csv:
+#   python -m benchmarks.synthetic [directory] [coils]
+#   BI_DASH_SOURCE=csv BI_DASH_CSV_DIR=<directory> python index.py
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from csvsource import CSV_DATE_FORMAT, CSV_FILES, DATASET_DIR
+
+ALLOYCODES = ['CRNO', 'CRGO', 'IF', 'DD', 'EDD', 'CQ', 'HSLA', 'DP']
+ENTRYWIDTHS = [900, 1000, 1050, 1100, 1250, 1300, 1500]
+EXITTHICKS = [0.35, 0.5, 0.65, 0.8, 1.0, 1.2, 1.5, 2.0, 2.5, 3.0]
+ZONES = 3
+START = '2017-08-05'
+
+# History the rows are spread over: at most about 7 years, like the plant DB. Small sets get the
+# plant's daily rate (25 coils, 40 stops a day) over fewer days; past the cap the days get denser,
+# so large sets keep realistic timestamps.
+HISTORY_DAYS = 7 * 365
+COILS_PER_DAY = 25
+STOPS_PER_DAY = 40
+
+
+# sorted seconds after start of n rows at per_day rows a day within HISTORY_DAYS, or over days
+def spread(rng, n, per_day, days=None):
+    if days is None:
+        days = min(max(-(-n // per_day), 1), HISTORY_DAYS)
+    return np.sort(rng.randint(0, days * 86400, n))
+
+# stop events: NPLANTTYPE 1 PL, 2 TCM, 3 PLTCM, and the delay codes booked against them
+PLANTS = [1, 2, 3]
+PLANT_SHARES = [0.45, 0.35, 0.2]
+DELAYS = {
+    101: 'ROLL CHANGE',
+    102: 'WORK ROLL CHANGE',
+    201: 'STRIP BREAK',
+    202: 'WELD FAILURE',
+    301: 'ELECTRICAL FAULT',
+    302: 'HYDRAULIC FAULT',
+    401: 'NO MATERIAL',
+    501: 'PLANNED MAINTENANCE',
+    601: 'QUALITY CHECK',
+    999: 'OTHERS',
+}
+
+
+# raw PRODUCTION_TAB / ORDER_TAB / RESULT_ZONE_TAB rows for n coils, COILS_PER_DAY or more a day
+def plant_tables(n, seed=0, start=START, days=None):
+    rng = np.random.RandomState(seed)
+    coil_out = np.array(['C{:08d}'.format(i) for i in range(n)])
+    coil_in = np.array(['H{:08d}'.format(i) for i in range(n)])
+    alloy = rng.choice(ALLOYCODES, n)
+    rolled = pd.Timestamp(start) + pd.to_timedelta(spread(rng, n, COILS_PER_DAY, days), unit='s')
+    welded = rolled - pd.to_timedelta(rng.randint(600, 1800, n), unit='s')
+    weight = np.round(rng.normal(18000, 3000, n), 2)
+    weight[rng.rand(n) < 0.02] = 0  # missing scale readings, imputed by DB.clean_production
+
+    production = pd.DataFrame({
+        'COILIDOUT': coil_out,
+        'COILIDIN_1': coil_in,
+        'ALLOYCODE': alloy,
+        'ENTRYTHICK': np.round(rng.uniform(1.8, 5.0, n), 2),
+        'EXITTHICK': rng.choice(EXITTHICKS, n),
+        'ENTRYDIAMPDI': np.round(rng.uniform(1500, 2100, n), 1),
+        'EXITWEIGHTCALC': weight,
+        'DTWELDED': welded,
+        'DTENDROLLING': rolled,
+        'DTDEPARTURE': rolled + pd.to_timedelta(rng.randint(300, 3600, n), unit='s'),
+    })
+    orders = pd.DataFrame({
+        'COILID': coil_in,
+        'ALLOYCODE': alloy,
+        'ENTRYWIDTH': rng.choice(ENTRYWIDTHS, n),
+    })
+    zones = pd.DataFrame({
+        'COILIDOUT': np.repeat(coil_out, ZONES),
+        'NZONE': np.tile(np.arange(1, ZONES + 1), n),
+        'LENGTHPHASEEXIT': np.round(rng.uniform(800, 3000, n * ZONES), 1),
+        'LENGTHTHICKTOL': np.round(rng.uniform(700, 3000, n * ZONES), 1),
+    })
+    return production, orders, zones
+
+
+# write the plant tables into a SQLite file with the keys the plant schema has
+def seed_sqlite(conn, n, seed=0):
+    production, orders, zones = plant_tables(n, seed)
+    for name, df in (('PRODUCTION_TAB', production), ('ORDER_TAB', orders), ('RESULT_ZONE_TAB', zones)):
+        df.to_sql(name, conn, if_exists='replace', index=False, chunksize=50000)
+    conn.execute('CREATE UNIQUE INDEX PK_PRODUCTION_TAB ON PRODUCTION_TAB (COILIDOUT)')
+    conn.execute('CREATE INDEX IX_ORDER_TAB ON ORDER_TAB (COILID)')
+    conn.execute('CREATE UNIQUE INDEX PK_RESULT_ZONE_TAB ON RESULT_ZONE_TAB (COILIDOUT, NZONE)')
+    conn.commit()
+
+
+# rows of PRODUCTION_SQL for n coils, before DB.clean_production (weights not imputed yet)
+def production_rows(n, seed=0, start=START, days=None):
+    production, orders, zones = plant_tables(n, seed, start, days)
+    zone1 = zones[zones.NZONE == 1].drop('NZONE', axis=1)
+    df = production.merge(orders, left_on=['COILIDIN_1', 'ALLOYCODE'], right_on=['COILID', 'ALLOYCODE'])
+    df = df.merge(zone1, on='COILIDOUT', how='left')
+    df = df.rename(columns={'COILIDIN_1': 'COILIDIN', 'EXITWEIGHTCALC': 'EXITWEIGHTMEAS', 'DTWELDED': 'DTSTARTROLL'})
+    return df[['COILIDOUT', 'COILIDIN', 'ALLOYCODE', 'ENTRYTHICK', 'EXITTHICK', 'ENTRYWIDTH', 'ENTRYDIAMPDI',
+               'EXITWEIGHTMEAS', 'DTSTARTROLL', 'DTDEPARTURE', 'DTENDROLLING', 'LENGTHPHASEEXIT', 'LENGTHTHICKTOL']]
+
+
+# frame shaped like the cleaned production dataset after the Production tab's date filter (DTENDROLLING parsed, Date added)
+def production_frame(n, seed=0):
+    df = production_rows(n, seed)
+    df.loc[df.EXITWEIGHTMEAS == 0, 'EXITWEIGHTMEAS'] = df['EXITWEIGHTMEAS'].mean()
+    df['Date'] = df.DTENDROLLING.dt.date
+    return df
+
+
+# rows of STOPTIME_SQL for n stop events, STOPS_PER_DAY or more a day over the three plants. Durations are
+# lognormal (mostly a few minutes, some stops last hours); DTSTORE is when the stop was booked.
+def stop_events(n, seed=0, start=START):
+    rng = np.random.RandomState(seed)
+    started = pd.Timestamp(start) + pd.to_timedelta(spread(rng, n, STOPS_PER_DAY), unit='s')
+    minutes = np.clip(rng.lognormal(2.0, 1.1, n), 0.5, 720)
+    ended = started + pd.to_timedelta(np.round(minutes * 60), unit='s')
+    codes = rng.choice(list(DELAYS), n)
+    return pd.DataFrame({
+        'PLANT': rng.choice(PLANTS, n, p=PLANT_SHARES),
+        'DTSTART': started,
+        'DTEND': ended,
+        'NDELAYCODE': codes,
+        'DELAYCOMMENT': pd.Series(codes).map(DELAYS).values,
+        'COILID1': np.array(['H{:08d}'.format(i) for i in rng.randint(0, max(n, 1), n)]),
+        'DTSTORE': ended + pd.to_timedelta(rng.randint(5, 300, n), unit='s'),
+    })
+
+
+# CSV source directory next to the checkout, written when no directory is given
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'bi_dash_csv')
+
+
+# Production export of n coils over the days of the stop time export in stops_dir, written to
+# path with a copy of that stop time export: the directory is a complete csvsource.CSVSource.
+# The coils rolled last before a stop booked against a coil get its id as COILIDIN, so the
+# Coil Report finds stops for them.
+def write_production_export(path=EXPORT_DIR, n=5000, seed=0, stops_dir=DATASET_DIR):
+    stops_path = os.path.join(stops_dir, CSV_FILES['stoptime'])
+    stops = pd.read_csv(stops_path, usecols=['COILID1', 'DTSTORE'], parse_dates=['DTSTORE'])
+    first = stops['DTSTORE'].min().normalize()
+    df = production_rows(n, seed, start=first, days=(stops['DTSTORE'].max() - first).days + 1)
+    booked = stops.dropna(subset=['COILID1']).groupby('COILID1')['DTSTORE'].min()
+    rows = np.maximum(df['DTENDROLLING'].values.searchsorted(booked.values) - 1, 0)
+    rows, first_booked = np.unique(rows, return_index=True)
+    df.loc[rows, 'COILIDIN'] = booked.index.values[first_booked]
+    os.makedirs(path, exist_ok=True)
+    df.to_csv(os.path.join(path, CSV_FILES['production']), index=False, date_format=CSV_DATE_FORMAT)
+    if os.path.abspath(path) != os.path.abspath(stops_dir):
+        shutil.copyfile(stops_path, os.path.join(path, CSV_FILES['stoptime']))
+    return df
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else EXPORT_DIR
+    write_production_export(path, n=int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
+    print(path)
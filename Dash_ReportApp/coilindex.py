@@ -0,0 +1,108 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# ids offered by the typeahead for one prefix
+SUGGESTIONS = 10
+
+
+# typed coil id as it is stored: trimmed and in upper case
+def normalize(coil_id):
+    if coil_id is None:
+        return None
+    return str(coil_id).strip().upper() or None
+
+
+# In-memory index of the coil ids of a dataset frame. Exact ids are found with a dict (id -> row
+# position, a list of them for ids on several rows) and id prefixes with a binary search in the
+# sorted distinct ids, so neither looks at the frame. Ids are indexed as stored (upper case in the
+# coil tables) and typed ids are normalized to that. The index keeps the frame it was built on:
+# rows are always read from the frame their positions belong to, even while a refresh swaps it.
+# Appended rows are indexed on their own; when the refresh had to re-sort the frame (late rows),
+# the positions moved and the index is rebuilt.
+class CoilIndex:
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.frame = None
+        self.version = 0
+        self._rows = {}
+        self._ids = np.array([], dtype=object)
+        self._last = None  # id of the last indexed row, to tell an append from a re-sort
+        self._lock = threading.Lock()
+
+    # RefreshEngine listener: full frames are indexed, appended blocks added to the index
+    def refresh(self, frame, new_rows):
+        with self._lock:
+            if new_rows is frame or not self._appended(frame, new_rows):
+                self._build(frame)
+            else:
+                self._add(frame, len(frame) - len(new_rows))
+            self.frame = frame
+            self.version += 1
+
+    # rows of the frame holding coil_id in any of the columns, in frame order
+    def lookup(self, coil_id):
+        key = normalize(coil_id)
+        with self._lock:
+            frame, rows = self.frame, self._rows.get(key)
+        if frame is None or rows is None:
+            return None if frame is None else frame.iloc[:0]
+        return frame.iloc[sorted(rows) if isinstance(rows, list) else [rows]]
+
+    # up to limit indexed ids starting with prefix, in id order
+    def complete(self, prefix, limit=SUGGESTIONS):
+        key = normalize(prefix)
+        if key is None:
+            return []
+        ids = self._ids
+        lo = ids.searchsorted(key, 'left')
+        hi = ids.searchsorted(key + '\uffff', 'left')
+        return ids[lo:min(hi, lo + limit)].tolist()
+
+    def _appended(self, frame, new_rows):
+        start = len(frame) - len(new_rows)
+        if self.frame is None or start != len(self.frame):
+            return False
+        return start == 0 or self._last == self._id_at(frame, start - 1)
+
+    def _build(self, frame):
+        self._rows = {}
+        self._ids = np.array([], dtype=object)
+        self._add(frame, 0)
+
+    # index the rows from position start on
+    def _add(self, frame, start):
+        rows = self._rows
+        new_ids = []
+        positions = range(start, len(frame))
+        for col in self.columns:
+            keys = np.asarray(frame[col].values[start:], dtype=object)
+            present = pd.notnull(keys)
+            keys = keys[present].tolist()
+            at = np.asarray(positions)[present].tolist() if not present.all() else positions
+            batch = dict(zip(keys, at))
+            # ids on a single row (nearly all) go in in one step, repeated ones one by one
+            if len(batch) == len(keys) and rows.keys().isdisjoint(batch):
+                rows.update(batch)
+                new_ids.extend(batch)
+                continue
+            for key, position in zip(keys, at):
+                known = rows.get(key)
+                if known is None:
+                    rows[key] = position
+                    new_ids.append(key)
+                elif isinstance(known, list):
+                    if position not in known:
+                        known.append(position)
+                elif known != position:
+                    rows[key] = [known, position]
+        if new_ids:
+            new_ids = np.array(new_ids, dtype=object)
+            new_ids.sort()
+            self._ids = np.insert(self._ids, self._ids.searchsorted(new_ids), new_ids) if len(self._ids) else new_ids
+        self._last = self._id_at(frame, len(frame) - 1) if len(frame) else None
+
+    def _id_at(self, frame, position):
+        return frame[self.columns[0]].iat[position]
@@ -0,0 +1,132 @@
+import os
+import pickle
+import threading
+import time
+
+import pandas as pd
+
+import timeindex
+from DBManager import Source, PRODUCTION_SCHEMA, TIME_COLUMNS, SCHEMAS, apply_schema, concat_batches
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Dataset')
+
+# timestamp format of the CSV exports, parsed with it instead of inferring
+CSV_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# rows parsed and typed at a time
+CSV_CHUNKSIZE = 100000
+
+# the stop time export is the raw STOP_TIME_TAB, the production one holds the PRODUCTION_SQL columns
+CSV_FILES = {'stoptime': 'STOP_TIME_TAB.csv', 'production': 'PRODUCTION_TAB.csv'}
+CSV_COLUMNS = {'stoptime': {'NPLANTTYPE': 'PLANT'}, 'production': {}}
+
+# read_csv dtypes per schema type; timestamps are read as text and parsed with CSV_DATE_FORMAT
+CSV_DTYPES = {'datetime': 'object', 'category': 'category', 'object': 'object'}
+
+
+# File backed source with the same fetch/get_production/get_stoptime contract as DB, for
+# running, profiling and load testing the dashboard offline. Each CSV is parsed once in typed
+# chunks and the result is pickled next to it (<file>.pkl); later starts load the pickle while
+# the CSV's size and mtime are unchanged. A missing production export gives an empty production
+# dataset.
+class CSVSource(Source):
+
+    def __init__(self, path=DATASET_DIR, chunksize=CSV_CHUNKSIZE, cache=True):
+        self.path = path
+        self.chunksize = chunksize
+        self.cache = cache
+        self.Error = (OSError, ValueError)
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    # same filters as DBManager.PRODUCTION_FILTERS/STOPTIME_FILTERS
+    def fetch(self, name, since=None, stats=None, start_date=None, end_date=None, min_thick=None,
+              max_thick=None, plant=None):
+        started = time.perf_counter()
+        table = self.table(name)
+        for start in (start_date, since):
+            if start is not None:
+                table = timeindex.time_slice(table, TIME_COLUMNS[name], start)
+        if end_date is not None:
+            if name == 'stoptime':  # whole days
+                end_date = pd.to_datetime(end_date) + pd.Timedelta(days=1)
+            table = timeindex.time_slice(table, TIME_COLUMNS[name], end=end_date,
+                                         closed='right' if name == 'production' else 'left')
+        if min_thick is not None:
+            table = table[table['EXITTHICK'] >= min_thick]
+        if max_thick is not None:
+            table = table[table['EXITTHICK'] <= max_thick]
+        if plant is not None:
+            table = table[table['PLANT'] == plant]
+        table = table.copy()
+        if stats is not None:
+            stats['rows'] = stats.get('rows', 0) + len(table)
+            stats['seconds'] = stats.get('seconds', 0) + time.perf_counter() - started
+        return table
+
+    # typed, time sorted rows of a dataset's export, parsed once per process
+    def table(self, name):
+        with self._lock:
+            if name not in self._tables:
+                self._tables[name] = self._load(name)
+            return self._tables[name]
+
+    def _load(self, name):
+        csv_path = os.path.join(self.path, CSV_FILES[name])
+        if not os.path.exists(csv_path):
+            return apply_schema(pd.DataFrame({col: [] for col in self._columns(name)}), SCHEMAS[name])
+        stamp = self._stamp(csv_path)
+        cache_path = csv_path + '.pkl'
+        if self.cache and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    cached_stamp, table = pickle.load(f)
+                if cached_stamp == stamp:
+                    return table
+            except (OSError, pickle.UnpicklingError, EOFError) as e:
+                print(e)
+        table = timeindex.sort_by_time(self._parse(name, csv_path), TIME_COLUMNS[name])
+        if self.cache:
+            tmp = cache_path + '.tmp'
+            try:
+                with open(tmp, 'wb') as f:
+                    pickle.dump((stamp, table), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, cache_path)
+            except OSError as e:
+                print(e)
+        return table
+
+    def _parse(self, name, csv_path):
+        schema = SCHEMAS[name]
+        renames = CSV_COLUMNS[name]
+        sources = {renames.get(col, col): col for col in self._csv_columns(csv_path)}
+        columns = [col for col in self._columns(name) if col in sources]
+        dtypes = {sources[col]: CSV_DTYPES.get(schema[col], 'float64') for col in columns}
+        chunks = []
+        for chunk in pd.read_csv(csv_path, usecols=list(dtypes), dtype=dtypes, chunksize=self.chunksize):
+            chunk = chunk.rename(columns={v: k for k, v in sources.items()})[columns]
+            for col in columns:
+                if schema[col] == 'datetime':
+                    chunk[col] = pd.to_datetime(chunk[col], format=CSV_DATE_FORMAT)
+            if name == 'stoptime':
+                chunk = chunk[chunk['DTEND'].notnull()]  # as STOPTIME_SQL
+            chunks.append(apply_schema(chunk.reset_index(drop=True), schema))
+        if not chunks:
+            return apply_schema(pd.DataFrame({col: [] for col in columns}), schema)
+        return concat_batches(chunks)
+
+    # columns the matching SQL returns, in its order
+    @staticmethod
+    def _columns(name):
+        if name == 'stoptime':
+            return ['PLANT', 'DTSTART', 'DTEND', 'NDELAYCODE', 'DELAYCOMMENT', 'COILID1', 'DTSTORE']
+        return list(PRODUCTION_SCHEMA)
+
+    @staticmethod
+    def _csv_columns(csv_path):
+        return pd.read_csv(csv_path, nrows=0).columns
+
+    @staticmethod
+    def _stamp(csv_path):
+        info = os.stat(csv_path)
+        return info.st_size, info.st_mtime_ns
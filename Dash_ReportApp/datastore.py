@@ -0,0 +1,176 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# number of filtered views kept in memory, least recently used ones are dropped
+MAX_VIEWS = 16
+
+
+# Server side home of the DataFrames used by the callbacks.
+# The page only carries a small JSON token {"key", "version", "filters"}; callbacks
+# resolve it here instead of shipping the table through the browser.
+# Datasets with a registered loader are loaded lazily, at most once per process, on first
+# use or by the background warm-up.
+class DatasetStore:
+
+    def __init__(self, max_views=MAX_VIEWS):
+        self.max_views = max_views
+        self._lock = threading.RLock()
+        self._frames = {}  # key -> (version, df)
+        self._filters = {}  # key -> fn(df, **filters)
+        self._views = OrderedDict()  # (key, version, filters) -> df
+        self._loaders = {}  # key -> fn() that put()s the dataset
+        self._loading = {}  # key -> lock held while the loader runs
+        self._load_seconds = {}
+        self._errors = {}
+        self._created = time.time()
+        self._ready_at = None
+
+    # store a new version of a dataset and return its version number
+    def put(self, key, df):
+        with self._lock:
+            version = self._frames[key][0] + 1 if key in self._frames else 1
+            self._frames[key] = (version, df)
+            for view_key in [k for k in self._views if k[0] == key]:
+                del self._views[view_key]
+        return version
+
+    # function used to build filtered views of a dataset
+    def register_filter(self, key, fn):
+        with self._lock:
+            self._filters[key] = fn
+
+    def register_loader(self, key, fn):
+        with self._lock:
+            self._loaders[key] = fn
+            self._loading[key] = threading.Lock()
+
+    # load a registered dataset unless it is already there; concurrent callers wait for one load
+    def ensure(self, key):
+        if key in self._frames or key not in self._loading:
+            return
+        with self._loading[key]:
+            if key in self._frames:
+                return
+            started = time.time()
+            try:
+                self._loaders[key]()
+                if key not in self._frames:
+                    raise KeyError('loader for {} did not store any data'.format(key))
+            except Exception as e:
+                self._errors[key] = str(e)
+                raise
+            self._load_seconds[key] = time.time() - started
+            self._errors.pop(key, None)
+            if self._ready_at is None and all(k in self._frames for k in self._loaders):
+                self._ready_at = time.time()
+
+    # load the registered datasets in background threads so the server can take requests meanwhile;
+    # the datasets load concurrently, at most workers at a time (all of them by default)
+    def warm_up(self, workers=None):
+        thread = threading.Thread(target=self._warm_up, args=(workers,), name='dataset-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up(self, workers=None):
+        keys = list(self._loaders)
+        if not keys:
+            return
+        with ThreadPoolExecutor(max_workers=workers or len(keys), thread_name_prefix='dataset-warm-up') as executor:
+            list(executor.map(self._warm_up_one, keys))
+
+    def _warm_up_one(self, key):
+        try:
+            self.ensure(key)
+        except Exception as e:
+            print(e)
+
+    # readiness of the registered datasets; startup_seconds is the time until all were loaded
+    def status(self):
+        with self._lock:
+            datasets = {
+                key: {
+                    'loaded': key in self._frames,
+                    'version': self._frames[key][0] if key in self._frames else None,
+                    'load_seconds': self._load_seconds.get(key),
+                    'error': self._errors.get(key),
+                }
+                for key in self._loaders
+            }
+        ready_at = self._ready_at
+        return {
+            'ready': all(d['loaded'] for d in datasets.values()),
+            'startup_seconds': None if ready_at is None else ready_at - self._created,
+            'datasets': datasets,
+        }
+
+    def version(self, key):
+        self.ensure(key)
+        with self._lock:
+            return self._frames[key][0]
+
+    def keys(self):
+        with self._lock:
+            return list(self._frames)
+
+    # key only handle for the static layout, does not load anything
+    def handle(self, key):
+        return json.dumps({'key': key})
+
+    # small handle that goes into the hidden divs; unset (None) filters are left out, so
+    # token(key) and token(key, start_date=None) name the same view
+    def token(self, key, **filters):
+        filters = {name: value for name, value in filters.items() if value is not None}
+        return json.dumps({'key': key, 'version': self.version(key), 'filters': filters}, sort_keys=True)
+
+    # filters carried by a token
+    def filters(self, token):
+        return self._parse(token).get('filters') or {}
+
+    # resolve a token to its DataFrame; stale versions resolve to the current data
+    def get(self, token):
+        token = self._parse(token)
+        key = token['key']
+        self.ensure(key)
+        with self._lock:
+            version, df = self._frames[key]
+            fn = self._filters.get(key)
+        if fn is None:
+            return df
+        filters = token.get('filters') or {}
+        return self._cached((key, version, self._filters_key(filters), None), lambda: fn(df, **filters))
+
+    # fn(view) computed once per token and cached next to the views, e.g. the grouped
+    # stats several callbacks of a tab are built from
+    def derive(self, token, name, fn):
+        token = self._parse(token)
+        key = token['key']
+        version = self.version(key)
+        filters = token.get('filters') or {}
+        return self._cached((key, version, self._filters_key(filters), name), lambda: fn(self.get(token)))
+
+    def _cached(self, view_key, compute):
+        with self._lock:
+            if view_key in self._views:
+                self._views.move_to_end(view_key)
+                return self._views[view_key]
+
+        view = compute()
+        with self._lock:
+            if self._frames[view_key[0]][0] == view_key[1]:
+                self._views[view_key] = view
+                while len(self._views) > self.max_views:
+                    self._views.popitem(last=False)
+        return view
+
+    @staticmethod
+    def _parse(token):
+        if isinstance(token, str):
+            token = json.loads(token)
+        return token
+
+    @staticmethod
+    def _filters_key(filters):
+        return tuple(sorted((name, value) for name, value in filters.items() if value is not None))
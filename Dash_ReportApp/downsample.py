@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# width in px the full width charts are drawn for; the server does not see the real one
+PLOT_WIDTH = 1200
+
+# narrowest bar worth drawing, in px
+MIN_BAR_PX = 6
+
+# bar buckets from fine to coarse: pandas period frequency and its length in days. Past the
+# yearly bars the count still grows, but by one bar a year.
+BAR_FREQUENCIES = [('D', 1), ('W', 7), ('M', 30.44), ('Q', 91.31), ('A', 365.25)]
+
+FREQUENCY_NAMES = {'D': 'per day', 'W': 'per week', 'M': 'per month', 'Q': 'per quarter', 'A': 'per year'}
+
+
+# finest bucket that keeps the bars of the days first..last at least MIN_BAR_PX wide
+def bar_frequency(first, last, width=PLOT_WIDTH):
+    if first is None or last is None or pd.isnull(first) or pd.isnull(last):
+        return 'D'
+    days = (pd.Timestamp(last) - pd.Timestamp(first)) / pd.Timedelta(days=1) + 1
+    bars = max(width // MIN_BAR_PX, 1)
+    for freq, length in BAR_FREQUENCIES:
+        if days / length <= bars:
+            return freq
+    return BAR_FREQUENCIES[-1][0]
+
+
+# Per day rows merged into buckets of freq, x becoming the first day of the bucket. sums are
+# added up, means are averaged weighted by the count column (the per day means of a different
+# number of rows each).
+def bucket_bars(df, x, freq, sums=(), means=(), count=None):
+    if freq == 'D' or df.empty:
+        return df
+    keys = pd.to_datetime(df[x]).dt.to_period(freq).dt.start_time.values
+    columns = {col: df[col].groupby(keys).sum() for col in sums}
+    if means:
+        weights = df[count].groupby(keys).sum()
+        for col in means:
+            columns[col] = (df[col] * df[count]).groupby(keys).sum() / weights.replace(0, np.nan)
+    bars = pd.DataFrame(columns)
+    bars.index.name = x
+    return bars.reset_index()
+
+
+# Days of the x axis range of a graph's relayoutData after a zoom or pan, widened to whole
+# days: the first day shown and the day after the last one, an end left out like the cube's
+# (rollup.ProductionCube.query). (None, None) when the axis was reset or the event is not an
+# x range.
+def zoom_range(relayout):
+    relayout = relayout or {}
+    if 'xaxis.range[0]' in relayout and 'xaxis.range[1]' in relayout:
+        lo, hi = relayout['xaxis.range[0]'], relayout['xaxis.range[1]']
+    elif 'xaxis.range' in relayout:
+        lo, hi = relayout['xaxis.range'][:2]
+    else:
+        return None, None
+    try:
+        lo, hi = pd.Timestamp(lo).floor('D'), pd.Timestamp(hi).ceil('D')
+    except (TypeError, ValueError):
+        return None, None
+    return lo.strftime('%Y-%m-%d'), hi.strftime('%Y-%m-%d')
+
+
+# the tighter of two ranges whose sides may be None (open)
+def narrow(start, end, zoom_start, zoom_end):
+    def pick(a, b, fn):
+        if a is None or b is None:
+            return b if a is None else a
+        return fn(pd.Timestamp(a), pd.Timestamp(b))
+    return pick(start, zoom_start, max), pick(end, zoom_end, min)
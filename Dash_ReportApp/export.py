@@ -0,0 +1,130 @@
+from urllib.parse import urlencode
+
+from csvsource import CSV_DATE_FORMAT
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # CSV exports only then
+    pa = None
+
+# rows serialized at a time; one chunk (and one Parquet row group) is all that is held in memory
+EXPORT_CHUNK_ROWS = 50000
+
+# query string filters on top of the date range: name -> (column, comparison, type)
+EXPORT_FILTERS = {
+    'plant': ('PLANT', 'eq', int),
+    'min_thick': ('EXITTHICK', 'ge', float),
+    'max_thick': ('EXITTHICK', 'le', float),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/octet-stream',
+}
+
+
+# href of the export of a dataset with the filters that are set
+def export_url(name, fmt, **filters):
+    query = urlencode(sorted((k, v) for k, v in filters.items() if v is not None))
+    return '/export/{}.{}'.format(name, fmt) + ('?' + query if query else '')
+
+
+# EXPORT_FILTERS values of a query string (request.args), typed; unknown keys are ignored
+def parse_filters(args):
+    filters = {}
+    for name, (col, op, cast) in EXPORT_FILTERS.items():
+        value = args.get(name)
+        if value not in (None, ''):
+            filters[name] = cast(value)
+    return filters
+
+
+# slices of df of up to chunk_rows rows with the filters applied, never the whole result at once
+def filtered_chunks(df, filters=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    filters = filters or {}
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        for name, value in filters.items():
+            col, op, cast = EXPORT_FILTERS[name]
+            if col not in chunk:
+                continue
+            if op == 'eq':
+                chunk = chunk[chunk[col] == value]
+            elif op == 'ge':
+                chunk = chunk[chunk[col] >= value]
+            else:
+                chunk = chunk[chunk[col] <= value]
+        if len(chunk):
+            yield chunk
+
+
+# CSV text of df, the header first and then one block per chunk
+def csv_chunks(df, filters=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    yield df.iloc[:0].to_csv(index=False)
+    for chunk in filtered_chunks(df, filters, chunk_rows):
+        yield chunk.to_csv(index=False, header=False, date_format=CSV_DATE_FORMAT)
+
+
+# Parquet file of df, written one row group per chunk; the bytes of each row group are passed
+# on as soon as it is written. Categorical columns stay dictionary encoded, each row group with
+# only the categories its rows use: a slice of a frame keeps the dictionary of the whole frame,
+# which for COILIDOUT is every coil ever loaded.
+def parquet_chunks(df, filters=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    if pa is None:
+        raise ImportError('pyarrow is required for Parquet exports')
+    sink = _ChunkSink()
+    schema = parquet_schema(df)
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in filtered_chunks(df, filters, chunk_rows):
+            chunk = used_categories(chunk)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+# Arrow schema of the frame's columns, the same for every chunk. Object columns hold text;
+# typed from an empty frame they would come out as null.
+def parquet_schema(df):
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, pa.field(field.name, pa.string()))
+    return schema
+
+
+# chunk with the categories no row of it uses dropped from its categorical columns
+def used_categories(chunk):
+    columns = chunk.select_dtypes('category').columns
+    if not len(columns):
+        return chunk
+    return chunk.assign(**{col: chunk[col].cat.remove_unused_categories() for col in columns})
+
+
+# write only file object for ParquetWriter, emptied by drain() after every row group
+class _ChunkSink:
+
+    def __init__(self):
+        self.closed = False
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
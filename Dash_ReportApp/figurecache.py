@@ -0,0 +1,83 @@
+import functools
+import threading
+from collections import OrderedDict
+
+# built figures / tables kept in memory, least recently used ones are dropped
+MAX_FIGURES = 128
+
+
+# LRU of the figures and tables the callbacks return, keyed by builder name, the version of the
+# dataset they were built from and the builder arguments (date range, slider value, ...).
+# A refresh of a dataset bumps its version, so old entries are never served again;
+# invalidate() drops them right away.
+class FigureCache:
+
+    def __init__(self, max_entries=MAX_FIGURES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (name, dataset, version, args) -> built value
+        self._hits = {}
+        self._misses = {}
+        self._evictions = 0
+
+    # decorator: fn(*args) is built once per version() of dataset and argument values
+    def memoize(self, dataset, version):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args):
+                return self.get(fn.__name__, dataset, version(), args, lambda: fn(*args))
+            return wrapper
+        return decorator
+
+    def get(self, name, dataset, version, args, build):
+        key = (name, dataset, version, _freeze(args))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits[name] = self._hits.get(name, 0) + 1
+                return self._entries[key]
+            self._misses[name] = self._misses.get(name, 0) + 1
+
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return value
+
+    # drop the entries built from a dataset, called when it refreshes
+    def invalidate(self, dataset):
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == dataset]:
+                del self._entries[key]
+
+    # hit/miss counters per builder and in total
+    def stats(self):
+        with self._lock:
+            names = sorted(set(self._hits) | set(self._misses))
+            builders = {
+                name: {'hits': self._hits.get(name, 0), 'misses': self._misses.get(name, 0)}
+                for name in names
+            }
+            size = len(self._entries)
+        hits = sum(b['hits'] for b in builders.values())
+        misses = sum(b['misses'] for b in builders.values())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+            'size': size,
+            'max_entries': self.max_entries,
+            'evictions': self._evictions,
+            'builders': builders,
+        }
+
+
+# hashable form of callback arguments, e.g. the [min, max] slider value
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
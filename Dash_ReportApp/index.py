@@ -7,9 +7,13 @@ import flask
 import plotly.plotly as py
 from plotly import graph_objs as go
 import math
-from app import app, server, DB
+from app import app, server, STORE, start_refresh
 from apps import coilreport, production, stoptime
 
+# load the datasets in the background, the server answers /ready with 503 until they are in
+STORE.warm_up()
+start_refresh()
+
 app.layout = html.Div(
     [
         # header
@@ -34,7 +38,7 @@ app.layout = html.Div(
                 style={"height": "20", "verticalAlign": "middle"},
                 children=[
                     dcc.Tab(label="Production", value="production_tab"),
-                   # dcc.Tab(label="Coil Report", value="coilreport_tab"),
+                    dcc.Tab(label="Coil Report", value="coilreport_tab"),
                     dcc.Tab(id="stoptime_tab", label="Stop Times", value="stoptime_tab"),
                 ],
                 value="production_tab",
@@ -44,9 +48,9 @@ app.layout = html.Div(
             className="row tabs_div"
         ),
 
-        # divs that save data frame for each tab
-        html.Div(DB.get_stoptime().to_json(orient="split"), id="stoptime_df", style={'display': "none"}),
-        html.Div(DB.get_production().to_json(orient="split"), id="production_df", style={'display': "none"}),
+        # divs that save the dataset token for each tab, the frames live in STORE
+        html.Div(STORE.handle('stoptime'), id="stoptime_df", style={'display': "none"}),
+        html.Div(STORE.handle('production'), id="production_df", style={'display': "none"}),
 
         # Tab content
         html.Div(id="tab_content", className="row", style={"margin": "2% 3%"}),
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+
+# Merged [start, end) intervals per group, as (groups, starts, ends) sorted by group and start.
+# Every interval is a +1 event at its start and a -1 event at its end; sorted by group and time,
+# the running sum of the events is the number of intervals in progress and the union is where it
+# is above 0. The events of a group sum to 0, so a single cumsum covers all groups. Intervals
+# that touch are merged; empty, reversed and open (NaT) ones are dropped.
+def union(starts, ends, groups=None):
+    starts = np.asarray(starts)
+    ends = np.asarray(ends)
+    groups = np.zeros(len(starts), dtype=np.int64) if groups is None else np.asarray(groups)
+    valid = ends > starts
+    starts, ends, groups = starts[valid], ends[valid], groups[valid]
+    n = len(starts)
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([np.ones(n, dtype=np.int64), np.full(n, -1, dtype=np.int64)])
+    event_groups = np.concatenate([groups, groups])
+    # at the same time starts come first, so touching intervals merge
+    order = np.lexsort((-deltas, times, event_groups))
+    times, deltas, event_groups = times[order], deltas[order], event_groups[order]
+    running = np.cumsum(deltas)
+    opens = (deltas == 1) & (running == 1)
+    closes = running == 0
+    return event_groups[opens], times[opens], times[closes]
+
+
+# Pieces of intervals split at sorted boundaries (midnights, shift changes), as
+# (rows, bins, starts, ends): the input interval and the period edges[bin]..edges[bin + 1] of
+# every piece. Parts outside edges[0]..edges[-1] are cut off.
+def clip(starts, ends, edges):
+    edges = np.asarray(edges)
+    starts = np.maximum(np.asarray(starts), edges[0])
+    ends = np.minimum(np.asarray(ends), edges[-1])
+    keep = np.flatnonzero(ends > starts)
+    starts, ends = starts[keep], ends[keep]
+    first = edges.searchsorted(starts, 'right') - 1
+    counts = edges.searchsorted(ends, 'left') - first
+    local = np.repeat(np.arange(len(keep)), counts)
+    # bin of a piece: the first bin of its interval plus its position among the interval's pieces
+    bins = first[local] + np.arange(len(local)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return (keep[local], bins,
+            np.maximum(starts[local], edges[bins]), np.minimum(ends[local], edges[bins + 1]))
+
+
+# Period boundaries covering first..last for a fixed frequency: midnights for freq='D', shift
+# changes for e.g. freq='8H', offset='6H' (shifts starting at 06:00, 14:00 and 22:00).
+def period_edges(first, last, freq='D', offset=None):
+    offset = pd.Timedelta(offset or 0)
+    start = (pd.Timestamp(first) - offset).floor(freq) + offset
+    end = (pd.Timestamp(last) - offset).ceil(freq) + offset
+    if end <= start:
+        end = start + pd.Timedelta(freq)
+    return pd.date_range(start, end, freq=freq).values
+
+
+# Downtime in minutes and availability (the share of the period without a stop) per group and
+# period, one row per group and period that has stops. Overlapping stops of a group count once
+# and stops are split at the period boundaries. With freq=None the only period is start..end,
+# which defaults to the span of the stops; with a freq the first and last periods are cut to it.
+def downtime(df, by='PLANT', start=None, end=None, freq=None, offset=None,
+             start_col='DTSTART', end_col='DTEND'):
+    starts = df[start_col].values
+    ends = df[end_col].values
+    valid = ends > starts
+    if start is None and valid.any():
+        start = starts[valid].min()
+    if end is None and valid.any():
+        end = ends[valid].max()
+    if start is None or end is None or pd.Timestamp(end) <= pd.Timestamp(start):
+        return pd.DataFrame({by: [], 'PERIOD': pd.to_datetime([]), 'DOWNTIME': [], 'AVAILABILITY': []})
+    start = pd.Timestamp(start).to_datetime64()
+    end = pd.Timestamp(end).to_datetime64()
+    groups, starts, ends = union(np.maximum(starts, start), np.minimum(ends, end), df[by].values)
+    if freq is None:
+        edges = np.array([start, end])
+    else:
+        edges = period_edges(start, end, freq, offset)
+    rows, bins, piece_starts, piece_ends = clip(starts, ends, edges)
+    pieces = pd.DataFrame({
+        by: groups[rows],
+        'BIN': bins,
+        'DOWNTIME': (piece_ends - piece_starts) / np.timedelta64(1, 'm'),
+    })
+    result = pieces.groupby([by, 'BIN'])['DOWNTIME'].sum().reset_index()
+    bins = result.pop('BIN').values
+    period_minutes = (np.minimum(edges[bins + 1], end) - np.maximum(edges[bins], start)) / np.timedelta64(1, 'm')
+    result.insert(1, 'PERIOD', edges[bins])
+    result['AVAILABILITY'] = 1 - result['DOWNTIME'] / period_minutes
+    return result
@@ -0,0 +1,168 @@
+import threading
+import time
+
+import flask
+
+# upper bounds of the histogram buckets: seconds for latencies, bytes for payloads
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# route every Dash callback is posted to
+CALLBACK_PATH = '/_dash-update-component'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# counter or gauge, one value per label set
+class Metric:
+
+    def __init__(self, name, help, kind, labels=()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    # gauges, and counters mirrored from totals kept elsewhere (e.g. the figure cache hits)
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, self.labels, key, value) for key, value in sorted(values.items())]
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+
+# cumulative buckets plus sum and count per label set
+class Histogram(Metric):
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        Metric.__init__(self, name, help, 'histogram', labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        samples = []
+        for key, (counts, total) in sorted(values.items()):
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                samples.append((self.name + '_bucket', self.labels + ('le',), key + (_number(bound),), count))
+            samples.append((self.name + '_sum', self.labels, key, total))
+            samples.append((self.name + '_count', self.labels, key, counts[-1]))
+        return samples
+
+
+# Metrics of the process in the Prometheus text format. Values read from other objects
+# (cache counters, dataset sizes, ...) are copied in by the functions passed to on_scrape().
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+        self._scrape = []
+
+    def counter(self, name, help, labels=()):
+        return self._add(Metric(name, help, 'counter', labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Metric(name, help, 'gauge', labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    # fn() is called before every render, to update gauges from their sources
+    def on_scrape(self, fn):
+        self._scrape.append(fn)
+
+    def render(self):
+        for fn in self._scrape:
+            try:
+                fn()
+            except Exception as e:
+                print(e)
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append('# HELP {} {}'.format(metric.name, metric.help))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+            for name, names, key, value in metric.samples():
+                lines.append('{}{} {}'.format(name, _labels(names, key), _number(value)))
+        return '\n'.join(lines) + '\n'
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+
+# Latency, request and response size of every Dash callback, labelled with the callback's
+# output (the component and property it updates). Responses of 400 and up also count as errors.
+def instrument_callbacks(server, registry):
+    latency = registry.histogram(
+        'bi_dash_callback_seconds', 'Time to answer a Dash callback.', ['output'])
+    request_bytes = registry.histogram(
+        'bi_dash_callback_request_bytes', 'Size of the callback request body.', ['output'], SIZE_BUCKETS)
+    response_bytes = registry.histogram(
+        'bi_dash_callback_response_bytes', 'Size of the callback response body.', ['output'], SIZE_BUCKETS)
+    errors = registry.counter(
+        'bi_dash_callback_errors_total', 'Callbacks answered with an error status.', ['output', 'status'])
+
+    @server.before_request
+    def start_callback_timer():
+        if flask.request.path == CALLBACK_PATH:
+            flask.g.callback_started = time.perf_counter()
+
+    @server.after_request
+    def observe_callback(response):
+        started = getattr(flask.g, 'callback_started', None)
+        if started is None:
+            return response
+        body = flask.request.get_json(silent=True) or {}
+        output = body.get('output', 'unknown')
+        latency.observe(time.perf_counter() - started, output=output)
+        request_bytes.observe(flask.request.content_length or 0, output=output)
+        if not response.is_streamed:
+            response_bytes.observe(response.calculate_content_length() or 0, output=output)
+        if response.status_code >= 400:
+            errors.inc(output=output, status=response.status_code)
+        return response
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value)) for name, value in zip(names, values)) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if value is None or value != value:
+        return 'NaN'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return str(value)
@@ -0,0 +1,99 @@
+import re
+
+import dash_table
+
+# rows per DataTable page served by the page callbacks
+PAGE_SIZE = 25
+
+# one condition of a DataTable filter string, e.g. {DATE} eq 2019-02-01 or "count" > 3
+FILTER_PART = re.compile(r'^\s*[{"\']?(?P<col>.+?)[}"\']?\s+(?P<op>eq|ne|lt|le|gt|ge|contains|=|!=|<=|>=|<|>)\s+(?P<value>.+?)\s*$')
+
+FILTER_OPERATORS = {
+    'eq': '==', '=': '==',
+    'ne': '!=', '!=': '!=',
+    'lt': '<', '<': '<',
+    'le': '<=', '<=': '<=',
+    'gt': '>', '>': '>',
+    'ge': '>=', '>=': '>=',
+    'contains': 'contains',
+}
+
+
+# DataTable paged, sorted and filtered by a callback: only the first page goes out with the
+# table, the page callback answers pagination_settings / sort_by / filter changes
+def paged_table(table_id, df, page_size=PAGE_SIZE, **kwargs):
+    pagination_settings = {'current_page': 0, 'page_size': page_size}
+    return dash_table.DataTable(
+        id=table_id,
+        columns=[{"name": i, "id": i} for i in df.columns],
+        data=table_page(df, pagination_settings),
+        pagination_mode='be',
+        pagination_settings=pagination_settings,
+        sorting='be',
+        sorting_type='single',
+        sort_by=[],
+        filtering='be',
+        filter='',
+        **kwargs
+    )
+
+
+# records of the visible page after filtering and sorting
+def table_page(df, pagination_settings=None, sort_by=None, filter=None):
+    df = sort_frame(filter_frame(df, filter), sort_by)
+    if pagination_settings:
+        page_size = pagination_settings.get('page_size') or PAGE_SIZE
+        start = (pagination_settings.get('current_page') or 0) * page_size
+        df = df.iloc[start:start + page_size]
+    return df.to_dict('records')
+
+
+def sort_frame(df, sort_by=None):
+    sort_by = [s for s in sort_by or [] if s.get('column_id') in df.columns]
+    if not sort_by:
+        return df
+    return df.sort_values([s['column_id'] for s in sort_by],
+                          ascending=[s.get('direction') != 'desc' for s in sort_by], kind='mergesort')
+
+
+# rows matching every && separated condition; unknown columns and malformed parts are ignored
+def filter_frame(df, filter=None):
+    if not filter:
+        return df
+    for part in filter.split(' && '):
+        match = FILTER_PART.match(part)
+        if match is None or match.group('col') not in df.columns:
+            continue
+        values = df[match.group('col')]
+        op = FILTER_OPERATORS[match.group('op')]
+        value = filter_value(match.group('value'), values)
+        if op != 'contains' and isinstance(value, str) and values.dtype.kind in 'biuf':
+            return df.iloc[0:0]  # text compared with a number column matches nothing
+        if op == 'contains':
+            mask = values.astype(str).str.contains(str(value), regex=False)
+        elif op == '==':
+            mask = values == value
+        elif op == '!=':
+            mask = values != value
+        elif op == '<':
+            mask = values < value
+        elif op == '<=':
+            mask = values <= value
+        elif op == '>':
+            mask = values > value
+        else:
+            mask = values >= value
+        df = df[mask.values]
+    return df
+
+
+# filter operand in the type of the column it is compared with
+def filter_value(text, values):
+    if len(text) > 1 and text[0] == text[-1] and text[0] in '"\'`':
+        text = text[1:-1]
+    if values.dtype.kind in 'biuf':
+        try:
+            return float(text)
+        except ValueError:
+            return text
+    return text
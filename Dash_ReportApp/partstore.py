@@ -0,0 +1,107 @@
+import glob
+import json
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # the dashboard runs without local persistence then
+    pa = None
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Dataset', 'store')
+
+
+# Local columnar copy of a dataset, one uncompressed Feather (Arrow IPC) file per month of
+# time_col: <root>/<name>/<YYYY-MM>.feather. Months outside the requested range are never
+# opened. The files are memory-mapped, so the Arrow tables read from them take no heap; the
+# pandas frame built from them is a copy, made once for all the months of a read.
+class PartitionedStore:
+
+    def __init__(self, name, time_col, time_format=None, root=STORE_DIR):
+        if pa is None:
+            raise ImportError('pyarrow is required for the partitioned store')
+        self.name = name
+        self.time_col = time_col
+        self.time_format = time_format
+        self.path = os.path.join(root, name)
+
+    # month keys on disk, oldest first
+    def partitions(self):
+        files = glob.glob(os.path.join(self.path, '*.feather'))
+        return sorted(os.path.splitext(os.path.basename(f))[0] for f in files)
+
+    # replace the store with a full frame
+    def write(self, df):
+        for month in self.partitions():
+            os.remove(self._file(month))
+        self.append(df)
+
+    # add rows; only the months they fall in are rewritten
+    def append(self, df):
+        if df is None or len(df) == 0:
+            return
+        months = self._times(df).dt.strftime('%Y-%m')
+        for month, rows in df.groupby(months.values, sort=True):
+            if os.path.exists(self._file(month)):
+                rows = pd.concat([self._read_month(month), rows], ignore_index=True, sort=False)
+            self._write_month(month, rows)
+
+    # JSON state of the dataset's owner kept next to the months (<root>/<name>/state.json),
+    # e.g. running stats the rows alone do not give back; {} when none was written
+    def write_state(self, state):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self._state_file() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self._state_file())
+
+    def read_state(self):
+        try:
+            with open(self._state_file()) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    # rows of the months overlapping [start_date, end_date]; callers apply their exact row filter
+    def read(self, start_date=None, end_date=None):
+        months = self.partitions()
+        if start_date is not None:
+            first = pd.to_datetime(start_date).strftime('%Y-%m')
+            months = [m for m in months if m >= first]
+        if end_date is not None:
+            last = pd.to_datetime(end_date).strftime('%Y-%m')
+            months = [m for m in months if m <= last]
+        if not months:
+            return None
+        tables = [self._read_table(m) for m in months]
+        if all(table.schema.equals(tables[0].schema) for table in tables[1:]):
+            return pa.concat_tables(tables).to_pandas()
+        # e.g. a category column whose codes need a wider integer in a later month
+        return pd.concat([table.to_pandas() for table in tables], ignore_index=True, sort=False)
+
+    def _times(self, df):
+        times = df[self.time_col]
+        if self.time_format is not None and not pd.api.types.is_datetime64_any_dtype(times):
+            times = pd.to_datetime(times, format=self.time_format)
+        return times
+
+    def _state_file(self):
+        return os.path.join(self.path, 'state.json')
+
+    def _file(self, month):
+        return os.path.join(self.path, month + '.feather')
+
+    def _read_table(self, month):
+        return feather.read_table(self._file(month), memory_map=True)
+
+    def _read_month(self, month):
+        return self._read_table(month).to_pandas()
+
+    # write next to the target and rename, readers never see a half written month
+    def _write_month(self, month, rows):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self._file(month) + '.tmp'
+        feather.write_feather(rows.reset_index(drop=True), tmp, compression='uncompressed')
+        os.replace(tmp, self._file(month))
@@ -0,0 +1,125 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# dimensions every Production tab chart and table is grouped by
+DIMENSIONS = ['Date', 'ALLOYCODE', 'ENTRYWIDTH', 'EXITTHICK']
+
+
+# how cell columns combine when cells of the same key are merged
+MERGE = {'coils': 'sum', 'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max', 'sumsq': 'sum'}
+
+
+# Single pass over the coils: one row per (Date, ALLOYCODE, ENTRYWIDTH, EXITTHICK) cell with the
+# coil count and the EXITWEIGHTMEAS count/sum/min/max/sum of squares. All KPIs, charts and
+# tables of the Production tab are rolled up from these cells instead of re-grouping the coils.
+def production_cells(df):
+    weight = df['EXITWEIGHTMEAS']
+    grouped = df.assign(sumsq=weight * weight).groupby(DIMENSIONS, observed=True)
+    cells = grouped['EXITWEIGHTMEAS'].agg(['size', 'count', 'sum', 'min', 'max'])
+    cells['sumsq'] = grouped['sumsq'].sum()
+    return cells.rename(columns={'size': 'coils'}).reset_index()
+
+
+# Production cells maintained over the whole history, one set of cells per day. Date range and
+# thickness queries slice the day-sorted cells with a binary search and merge them, so answering
+# one costs the number of days in the range, not the number of coils.
+class ProductionCube:
+
+    def __init__(self, time_col='DTENDROLLING', time_format=None):
+        self.time_col = time_col
+        self.time_format = time_format
+        self.cells = pd.DataFrame(columns=DIMENSIONS + list(MERGE))
+        self.version = 0
+        self._days = np.array([], dtype='datetime64[ns]')
+        self._lock = threading.Lock()
+
+    # replace the cube with the cells of a full production frame
+    def build(self, df):
+        with self._lock:
+            self._publish(production_cells(self._with_date(df)))
+
+    # merge the cells of newly arrived coils; only the days they touch are re-combined
+    def update(self, new_rows):
+        if new_rows is None or len(new_rows) == 0:
+            return
+        new_cells = production_cells(self._with_date(new_rows))
+        with self._lock:
+            if self.cells.empty:
+                self._publish(new_cells)
+                return
+            touched = self.cells['Date'].isin(new_cells['Date'].unique())
+            merged = pd.concat([self.cells[touched], new_cells], sort=False)
+            merged = merged.groupby(DIMENSIONS, observed=True).agg(MERGE).reset_index()
+            self._publish(pd.concat([self.cells[~touched], merged], ignore_index=True, sort=False))
+
+    # cells of the days in (start_date, end_date], optionally limited to an exit thickness range.
+    # Day granularity: the start day is included, the end day only when end_date is past midnight.
+    def query(self, start_date=None, end_date=None, min_thick=None, max_thick=None):
+        cells, days = self.cells, self._days
+        lo = 0 if start_date is None else days.searchsorted(pd.to_datetime(start_date).normalize().to_datetime64())
+        hi = len(days) if end_date is None else days.searchsorted(pd.to_datetime(end_date).to_datetime64())
+        cells = cells.iloc[lo:hi]
+        if min_thick is not None:
+            cells = cells[cells['EXITTHICK'] >= min_thick]
+        if max_thick is not None:
+            cells = cells[cells['EXITTHICK'] <= max_thick]
+        return cells
+
+    def _with_date(self, df):
+        stamps = df[self.time_col]
+        if not np.issubdtype(stamps.dtype, np.datetime64):
+            stamps = pd.to_datetime(stamps, format=self.time_format)
+        return df.assign(Date=stamps.dt.normalize())
+
+    def _publish(self, cells):
+        cells = cells.sort_values('Date', kind='mergesort').reset_index(drop=True)
+        self._days = cells['Date'].values
+        self.cells = cells
+        self.version += 1
+
+
+# coil count and total weight over all cells
+def totals(cells):
+    return int(cells['coils'].sum()), float(cells['sum'].sum())
+
+
+# total weight per day
+def daily_weight(cells):
+    return cells.groupby('Date')['sum'].sum().reset_index().rename(columns={'sum': 'EXITWEIGHTMEAS'})
+
+
+# coil count and EXITTHICK mean/min/max per dimension, the describe() columns the tables use
+def thickness_by(cells, dimension):
+    grouped = cells.groupby(dimension, observed=True)
+    count = grouped['coils'].sum()
+    stats = pd.DataFrame({
+        'count': count,
+        'mean': (cells['EXITTHICK'] * cells['coils']).groupby(cells[dimension], observed=True).sum() / count,
+        'min': grouped['EXITTHICK'].min(),
+        'max': grouped['EXITTHICK'].max(),
+    }, columns=['count', 'mean', 'min', 'max'])
+    return stats.sort_index().reset_index()
+
+
+# EXITWEIGHTMEAS standard deviation per cell set, from the stored sums of squares
+def weight_std(cells):
+    count = cells['count'].sum()
+    if count < 2:
+        return np.nan
+    mean = cells['sum'].sum() / count
+    return np.sqrt(max(cells['sumsq'].sum() / count - mean * mean, 0) * count / (count - 1))
+
+
+# EXITWEIGHTMEAS count/mean/min/max per exit thickness
+def weight_by_thickness(cells):
+    grouped = cells.groupby('EXITTHICK')
+    count = grouped['count'].sum()
+    stats = pd.DataFrame({
+        'count': count,
+        'mean': grouped['sum'].sum() / count.replace(0, np.nan),
+        'min': grouped['min'].min(),
+        'max': grouped['max'].max(),
+    }, columns=['count', 'mean', 'min', 'max'])
+    return stats.reset_index()
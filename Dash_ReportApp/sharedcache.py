@@ -0,0 +1,222 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # every process loads its own datasets then
+    pa = None
+
+# snapshots live in shared memory where there is one; BI_DASH_SHARED_DIR separates several
+# dashboards on one machine
+SHARED_DIR = os.environ.get('BI_DASH_SHARED_DIR') or os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'bi_dash')
+
+# seconds between two checks for a new snapshot (or a vacant leader lock)
+FOLLOW_INTERVAL = 5
+
+# seconds a worker waits for the first snapshot of a dataset before its load fails
+ATTACH_TIMEOUT = 600
+
+# snapshots kept per dataset; workers may still be mapping the previous one
+KEEP_SNAPSHOTS = 2
+
+# schema metadata key of the RefreshEngine.state() a snapshot was written with
+STATE_KEY = 'bi_dash.state'
+
+
+# Dataset cache shared by the server processes of one machine. The process holding the leader
+# lock (an fcntl lock on <path>/leader.lock) runs the RefreshEngine and writes every new version
+# of a dataset as an uncompressed Arrow IPC file, <path>/<name>/<version>.arrow, then points
+# <path>/<name>/CURRENT at it, with the engine's state() in the schema metadata. The other
+# processes never query the source: they memory-map the current snapshot, so numeric,
+# timestamp and text columns are read-only views of the shared pages instead of a copy per
+# worker (text as Arrow backed strings). The categories of the categorical columns are still
+# built per process.
+# If the leader exits its lock is released and the next worker to check takes over, continuing
+# from the snapshot it already holds.
+# Live views of a follower do not refresh a dataset themselves either: they leave a request,
+# <path>/<name>/LIVE holding the wanted max age, and the leader refreshes while it is recent.
+class SharedCache:
+
+    def __init__(self, engine, path=SHARED_DIR, interval=FOLLOW_INTERVAL, attach_timeout=ATTACH_TIMEOUT):
+        if pa is None:
+            raise ImportError('pyarrow is required for the shared dataset cache')
+        self.engine = engine
+        self.path = path
+        self.interval = interval
+        self.attach_timeout = attach_timeout
+        self.versions = {}  # name -> snapshot version published or attached by this process
+        self._lock_file = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(path, exist_ok=True)
+        engine.subscribe(self.publish)
+
+    # True when this process holds the leader lock. The lock is taken on first use and
+    # re-tried after a fork, a forked worker does not inherit its parent's leadership.
+    def is_leader(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._lock_file = None
+            self._elect()
+        return self._lock_file is not None
+
+    # STORE loader: the leader loads from the source, the others attach to its snapshots
+    def load_dataset(self, name):
+        deadline = time.time() + self.attach_timeout
+        while not self.is_leader():
+            if self.attach(name):
+                return
+            if time.time() > deadline:
+                raise TimeoutError('no shared snapshot of {} after {}s'.format(name, self.attach_timeout))
+            time.sleep(1)
+            self._promote()
+        self.engine.load_dataset(name)
+
+    # RefreshEngine.poll() for live views: the leader refreshes, a follower asks the leader to
+    # and takes over the newest snapshot. Returns the rows added, 0 or the new frame's length.
+    def poll(self, name, max_age):
+        if self.is_leader():
+            return self.engine.poll(name, max_age)
+        os.makedirs(self._dir(name), exist_ok=True)
+        self._replace(self._live_file(name), lambda sink: sink.write(str(max_age).encode()))
+        if not self.attach(name):
+            return 0
+        return len(self.engine.frames[name])
+
+    # leader: scheduled refreshes; workers: pick up new snapshots and watch the leader lock
+    def start(self):
+        if self.is_leader():
+            self.engine.start()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='shared-cache', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+        self.engine.stop()
+
+    # RefreshEngine listener: the leader writes every new version of a dataset
+    def publish(self, name, frame, new_rows):
+        if not self.is_leader():
+            return
+        version = max(self.current(name) or 0, self.versions.get(name, 0)) + 1
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        metadata = dict(table.schema.metadata or {}, **{STATE_KEY: json.dumps(self.engine.state(name))})
+        table = table.replace_schema_metadata(metadata)
+        os.makedirs(self._dir(name), exist_ok=True)
+        self._replace(self._file(name, version), lambda sink: self._write_table(sink, table))
+        self._replace(os.path.join(self._dir(name), 'CURRENT'), lambda sink: sink.write(str(version).encode()))
+        self.versions[name] = version
+        self._prune(name)
+
+    # take over the current snapshot of a dataset if it is newer than the one held
+    def attach(self, name):
+        version = self.current(name)
+        if version is None or version == self.versions.get(name):
+            return False
+        try:
+            table = pa.ipc.open_file(pa.memory_map(self._file(name, version))).read_all()
+        except FileNotFoundError:  # pruned meanwhile, the next check finds the newer one
+            return False
+        self.versions[name] = version
+        state = json.loads((table.schema.metadata or {}).get(STATE_KEY.encode(), b'{}'))
+        self.engine.restore(name, table.to_pandas(split_blocks=True, types_mapper=_text_type), state)
+        return True
+
+    # version CURRENT points at, None before the first snapshot
+    def current(self, name):
+        try:
+            with open(os.path.join(self._dir(name), 'CURRENT')) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.is_leader() or self._promote():
+                    self._serve_live()
+                    continue
+                for name in list(self.versions):
+                    self.attach(name)
+            except Exception as e:
+                print(e)
+
+    # leader: refresh the datasets a follower's live view asked for within the last two max ages
+    def _serve_live(self):
+        for name in list(self.engine.frames):
+            try:
+                with open(self._live_file(name)) as f:
+                    max_age = float(f.read())
+                asked = os.path.getmtime(self._live_file(name))
+            except (FileNotFoundError, ValueError):
+                continue
+            if time.time() - asked < 2 * max_age:
+                self.engine.poll(name, max_age)
+
+    # take the lock of a leader that has gone and continue its refreshes
+    def _promote(self):
+        if not self._elect():
+            return False
+        print('shared cache: taking over the dataset refresh')
+        self.engine.start()
+        return True
+
+    def _elect(self):
+        lock_file = open(os.path.join(self.path, 'leader.lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _prune(self, name):
+        for version in sorted(self._versions_on_disk(name))[:-KEEP_SNAPSHOTS]:
+            try:
+                os.remove(self._file(name, version))
+            except FileNotFoundError:
+                pass
+
+    def _versions_on_disk(self, name):
+        return [int(f[:-len('.arrow')]) for f in os.listdir(self._dir(name)) if f.endswith('.arrow')]
+
+    @staticmethod
+    def _write_table(sink, table):
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    # write next to the target and rename, readers never see a half written file
+    @staticmethod
+    def _replace(path, write):
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with pa.OSFile(tmp, 'wb') as sink:
+            write(sink)
+        os.replace(tmp, path)
+
+    def _dir(self, name):
+        return os.path.join(self.path, name)
+
+    def _live_file(self, name):
+        return os.path.join(self._dir(name), 'LIVE')
+
+    def _file(self, name, version):
+        return os.path.join(self._dir(name), '{:08d}.arrow'.format(version))
+
+
+# text columns as pandas strings backed by the mapped Arrow buffers instead of Python objects
+def _text_type(arrow_type):
+    if arrow_type in (pa.string(), pa.large_string()):
+        return pd.StringDtype('pyarrow')
+    return None
@@ -0,0 +1,40 @@
+# Parquet exports: a few rows of a frame with many categories. Run from Dash_ReportApp:
+#   python -m pytest -q test_export.py
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import export
+
+COILS = 100000
+
+
+def coils(n=COILS):
+    return pd.DataFrame({
+        'COILIDOUT': pd.Categorical(['C%08d' % i for i in range(n)]),
+        'PLANT': np.arange(n) % 3 + 1,
+        'EXITTHICK': np.linspace(0.5, 3.0, n),
+    })
+
+
+def parquet(df, filters=None, chunk_rows=export.EXPORT_CHUNK_ROWS):
+    return b''.join(export.parquet_chunks(df, filters, chunk_rows))
+
+
+def test_small_export_stays_small():
+    df = coils()
+    data = parquet(df.iloc[-100:])
+    assert len(data) < 20000  # the whole COILIDOUT dictionary alone is about 1 MB
+    result = pq.read_table(io.BytesIO(data)).to_pandas()
+    assert result['COILIDOUT'].astype(str).tolist() == df['COILIDOUT'].iloc[-100:].astype(str).tolist()
+
+
+def test_chunks_keep_their_own_categories():
+    df = coils(1000)
+    data = parquet(df, {'plant': 2}, chunk_rows=300)
+    result = pq.read_table(io.BytesIO(data)).to_pandas()
+    expected = df[df['PLANT'] == 2]
+    assert result['COILIDOUT'].astype(str).tolist() == expected['COILIDOUT'].astype(str).tolist()
+    assert result['EXITTHICK'].tolist() == expected['EXITTHICK'].tolist()
@@ -0,0 +1,74 @@
+# intervals.downtime() against a per minute brute force: the minutes of a period covered by at
+# least one stop of a group. Run from Dash_ReportApp:  python -m pytest -q test_intervals.py
+import numpy as np
+import pandas as pd
+
+import intervals
+
+DAY = '2019-03-01'
+
+
+def stops(rows):
+    return pd.DataFrame({
+        'PLANT': [plant for plant, _, _ in rows],
+        'DTSTART': pd.to_datetime([start for _, start, _ in rows]),
+        'DTEND': pd.to_datetime([end for _, _, end in rows]),
+    })
+
+
+# downtime minutes per (plant, period start) counted minute by minute
+def brute_force(df, start, end, freq):
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    minutes = pd.date_range(start, end, freq='T', inclusive='left')
+    result = {}
+    for plant, group in df.groupby('PLANT'):
+        covered = np.zeros(len(minutes), dtype=bool)
+        for stop_start, stop_end in zip(group['DTSTART'], group['DTEND']):
+            if pd.notnull(stop_start) and pd.notnull(stop_end):
+                covered |= (minutes >= stop_start) & (minutes < stop_end)
+        periods = minutes.floor(freq)
+        for period, count in pd.Series(covered).groupby(periods).sum().items():
+            if count:
+                result[(plant, period)] = float(count)
+    return result
+
+
+def computed(df, start, end, freq):
+    result = intervals.downtime(df, 'PLANT', start, end, freq)
+    return {(plant, pd.Timestamp(period)): downtime
+            for plant, period, downtime in zip(result['PLANT'], result['PERIOD'], result['DOWNTIME'])}
+
+
+def test_edge_cases():
+    df = stops([
+        (1, DAY + ' 08:00', DAY + ' 08:30'),
+        (1, DAY + ' 08:30', DAY + ' 09:00'),  # touching the one before, merged
+        (1, DAY + ' 08:10', DAY + ' 08:20'),  # inside another stop, counts once
+        (1, DAY + ' 10:00', None),  # still open, not counted
+        (1, DAY + ' 12:00', DAY + ' 11:00'),  # reversed, not counted
+        (2, '2019-02-28 23:00', DAY + ' 01:00'),  # crossing the window start
+        (2, DAY + ' 23:30', '2019-03-02 00:30'),  # crossing midnight
+        (3, '2019-03-02 23:00', '2019-03-03 02:00'),  # crossing the window end
+    ])
+    expected = brute_force(df, DAY, '2019-03-03', 'D')
+    assert computed(df, DAY, '2019-03-03', 'D') == expected
+    assert expected[(1, pd.Timestamp(DAY))] == 60
+    assert expected[(2, pd.Timestamp(DAY))] == 90
+
+
+def test_availability_of_cut_periods():
+    df = stops([(1, DAY + ' 06:00', DAY + ' 09:00')])
+    result = intervals.downtime(df, 'PLANT', DAY + ' 06:00', DAY + ' 12:00', 'D')
+    assert result['DOWNTIME'].tolist() == [180]
+    assert result['AVAILABILITY'].tolist() == [0.5]  # the period is cut to the 6 hours of the window
+
+
+def test_random_stops():
+    rng = np.random.RandomState(0)
+    n = 300
+    starts = pd.Timestamp(DAY) + pd.to_timedelta(rng.randint(-600, 3 * 1440, n), unit='m')
+    ends = starts + pd.to_timedelta(rng.randint(-30, 240, n), unit='m')
+    df = pd.DataFrame({'PLANT': rng.choice([1, 2, 3], n), 'DTSTART': starts, 'DTEND': ends})
+    df.loc[rng.rand(n) < 0.05, 'DTEND'] = pd.NaT
+    for freq in ('D', '8H'):
+        assert computed(df, DAY, '2019-03-04', freq) == brute_force(df, DAY, '2019-03-04', freq)
@@ -0,0 +1,87 @@
+# Filters of Source.get_production/get_stoptime: bound as variables by DB, applied the same way
+# by CSVSource. Run from Dash_ReportApp:  python -m pytest -q test_sources.py
+import datetime
+
+from DBManager import DB, PRODUCTION_SCHEMA, STOPTIME_SCHEMA, SQLiteBackend
+from csvsource import CSVSource
+from benchmarks.synthetic import write_production_export
+
+
+# backend whose cursors record the statements and return no rows
+class RecordingBackend(SQLiteBackend):
+
+    def __init__(self):
+        super().__init__()
+        self.executed = []
+
+    def cursor(self, conn, arraysize, prefetchrows):
+        return RecordingCursor(self.executed)
+
+
+class RecordingCursor:
+
+    def __init__(self, executed):
+        self.executed = executed
+        self.description = None
+
+    def execute(self, query, params):
+        self.executed.append((query, params))
+        schema = PRODUCTION_SCHEMA if 'PRODUCTION_TAB' in query else STOPTIME_SCHEMA
+        self.description = [(col,) for col in schema]
+
+    def fetchmany(self):
+        return []
+
+    def close(self):
+        pass
+
+
+def test_db_binds_each_filter():
+    backend = RecordingBackend()
+    db = DB(backend)
+    db.get_production('2019-03-01', '2019-03-31 12:00', 0.5, 1.5)
+    db.get_stoptime('2019-03-01 08:00', '2019-03-31', 2)
+    (production_sql, production_params), (stoptime_sql, stoptime_params) = backend.executed
+
+    assert production_params == {
+        'start_date': datetime.datetime(2019, 3, 1), 'end_date': datetime.datetime(2019, 3, 31, 12),
+        'min_thick': 0.5, 'max_thick': 1.5}
+    assert stoptime_params == {
+        'start_date': datetime.datetime(2019, 3, 1), 'end_date': datetime.datetime(2019, 3, 31), 'plant': 2}
+    for name in production_params:
+        assert ':' + name in production_sql
+    for name in stoptime_params:
+        assert ':' + name in stoptime_sql
+    assert ':since' not in production_sql + stoptime_sql
+
+
+def test_db_leaves_out_unset_filters():
+    backend = RecordingBackend()
+    DB(backend).get_stoptime(plant=3)
+    query, params = backend.executed[0]
+    assert params == {'plant': 3}
+    assert ':start_date' not in query and ':end_date' not in query
+
+
+def test_csv_source_applies_each_filter(tmp_path):
+    write_production_export(str(tmp_path), n=2000)
+    source = CSVSource(str(tmp_path), cache=False)
+    every_coil = source.table('production')
+    start = every_coil['DTENDROLLING'].iloc[500]
+    end = every_coil['DTENDROLLING'].iloc[1500]
+
+    coils = source.get_production(start, end, 0.8, 2.0)
+    assert len(coils)
+    assert coils['DTENDROLLING'].between(start, end).all()
+    assert coils['EXITTHICK'].between(0.8, 2.0).all()
+    expected = every_coil[every_coil['DTENDROLLING'].between(start, end)
+                          & every_coil['EXITTHICK'].between(0.8, 2.0)]
+    assert sorted(coils['COILIDOUT'].astype(str)) == sorted(expected['COILIDOUT'].astype(str))
+
+    every_stop = source.table('stoptime')
+    day = every_stop['DTSTORE'].iloc[len(every_stop) // 2].normalize()
+    stops = source.get_stoptime(day, day, 1)
+    assert len(stops)
+    assert (stops['DTSTORE'].dt.normalize() == day).all()  # the end day is a whole day
+    assert (stops['PLANT'] == 1).all()
+    assert len(stops) == ((every_stop['DTSTORE'].dt.normalize() == day) & (every_stop['PLANT'] == 1)).sum()
@@ -0,0 +1,67 @@
+# Live mode of the Stop Times tab: a refresh that books a stop before the watermark (closed
+# late, re-fetched by the lookback) redraws the summary instead of being lost to the deltas.
+# Run from Dash_ReportApp:  python -m pytest -q test_stoptime_live.py
+import json
+import os
+
+import pandas as pd
+from dash.exceptions import PreventUpdate
+
+os.environ['BI_DASH_SOURCE'] = 'csv'  # the app is imported without a database connection
+
+from DBManager import STOPTIME_SCHEMA, Source, apply_schema
+from app import STORE
+from apps import stoptime
+from benchmarks.synthetic import stop_events
+
+
+def stops(n, seed=0):
+    return Source().derive_stoptime(apply_schema(stop_events(n, seed), STOPTIME_SCHEMA))
+
+
+def book(frame, rows):
+    STORE.put('stoptime', pd.concat([frame, rows]).sort_values('DTSTORE', kind='mergesort')
+              .reset_index(drop=True))
+
+
+# props the live callback updates, {} when it sends nothing
+def tick(summary, last=None):
+    try:
+        response = stoptime.stop_live_callback(1, summary, last)
+    except PreventUpdate:
+        return {}
+    return {component: props['data'] for component, props in json.loads(response)['response'].items()}
+
+
+def test_late_closed_stop_redraws_the_summary():
+    frame = stops(200)
+    STORE.put('stoptime', frame)
+    summary = stoptime.stop_summary_view(None, None)
+    assert tick(summary) == {}
+
+    watermark = pd.Timestamp(summary['watermark'])
+    late = stops(1, seed=1).assign(DTSTORE=watermark - pd.Timedelta(hours=3))
+    book(frame, late)
+    update = tick(summary)
+    assert list(update) == ['stop_redraw']
+    redrawn = stoptime.stop_summary_view(None, None)
+    assert redrawn['rows'] == summary['rows'] + 1
+    assert sum(redrawn['counts']) == sum(summary['counts']) + 1
+
+
+def test_stops_after_the_watermark_come_as_a_delta():
+    frame = stops(200)
+    STORE.put('stoptime', frame)
+    summary = stoptime.stop_summary_view(None, None)
+    watermark = pd.Timestamp(summary['watermark'])
+    new = stops(2, seed=2).assign(DTSTORE=[watermark + pd.Timedelta(minutes=5),
+                                           watermark + pd.Timedelta(hours=1)])
+    book(frame, new)
+    delta = tick(summary)['stop_live']
+    assert sum(count for count, total in delta['days'].values()) == 2
+    assert delta['rows'] == summary['rows'] + 2
+    assert tick(summary, delta) == {}  # counted once
+
+    # a late stop after a delta is found against the delta's count
+    book(STORE.get(STORE.token('stoptime')), stops(1, seed=3).assign(DTSTORE=watermark - pd.Timedelta(hours=1)))
+    assert list(tick(summary, delta)) == ['stop_redraw']
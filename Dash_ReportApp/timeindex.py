@@ -0,0 +1,28 @@
+import pandas as pd
+
+
+# frame sorted by a parsed timestamp column, left as is when it already is
+def sort_by_time(df, col):
+    if df[col].is_monotonic_increasing:
+        return df
+    return df.sort_values(col, kind='mergesort').reset_index(drop=True)
+
+
+# append rows keeping the time order; in-order blocks (the usual refresh) are not re-sorted
+def append_sorted(df, new_rows, col):
+    new_rows = sort_by_time(new_rows, col)
+    frame = pd.concat([df, new_rows], ignore_index=True, sort=False)
+    if len(df) and len(new_rows) and new_rows[col].min() < df[col].iloc[-1]:
+        return sort_by_time(frame, col)
+    return frame
+
+
+# Rows of a time sorted frame inside a range, found with two binary searches.
+# closed='left' is [start, end), closed='right' is (start, end]. The result is an iloc slice,
+# so it shares the column data of df instead of copying it.
+def time_slice(df, col, start=None, end=None, closed='left'):
+    times = df[col].values
+    side = 'left' if closed == 'left' else 'right'
+    lo = 0 if start is None else times.searchsorted(pd.Timestamp(start).to_datetime64(), side=side)
+    hi = len(times) if end is None else times.searchsorted(pd.Timestamp(end).to_datetime64(), side=side)
+    return df.iloc[lo:max(lo, hi)]